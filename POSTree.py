@@ -1,146 +1,748 @@
+import argparse
+import builtins
+import codecs
+import collections
+import hashlib
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
 from operator import itemgetter
 
 DEBUG = False
+# Stamp of the conversion rules, bump it whenever adjust_order() changes
+# its output so that DiskCache drops the stale entries.
+RULES_VERSION = 3
+# A RuleStats to record rule hits, failures and stage times into, or None.
+COLLECTOR = None
+
+# Status of a Result: converted, a question of an unsupported structure,
+# or a text which is not a parse tree.
+OK = 'ok'
+UNSUPPORTED = 'unsupported'
+MALFORMED = 'malformed'
+
+Result = collections.namedtuple('Result', 'status statement reason')
+
+# Labels of the Penn Treebank, in the order of their fixed codes in
+# CompactTree.labels. Nodes share one string object per label.
+PTB_LABELS = (
+    'ROOT', 'S', 'SBAR', 'SBARQ', 'SINV', 'SQ', 'ADJP', 'ADVP', 'CONJP',
+    'FRAG', 'INTJ', 'LST', 'NAC', 'NP', 'NX', 'PP', 'PRN', 'PRT', 'QP', 'RRC',
+    'UCP', 'VP', 'WHADJP', 'WHADVP', 'WHNP', 'WHPP', 'X',
+    'CC', 'CD', 'DT', 'EX', 'FW', 'IN', 'JJ', 'JJR', 'JJS', 'LS', 'MD', 'NN',
+    'NNS', 'NNP', 'NNPS', 'PDT', 'POS', 'PRP', 'PRP$', 'RB', 'RBR', 'RBS',
+    'RP', 'SYM', 'TO', 'UH', 'VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ', 'WDT',
+    'WP', 'WP$', 'WRB', '.', ',', ':', '``', "''", '-LRB-', '-RRB-', '#', '$',
+    'HYPH', 'NFP', 'ADD', 'AFX', 'GW', 'XX', '-NONE-')
+_LABELS = dict((sys.intern(label), sys.intern(label)) for label in PTB_LABELS)
+
+_TOKEN = re.compile(r'[()]|[^() ]+')
+
+
+def tokenize(text):
+    """Split a parse tree into '(', ')', labels and words.
+
+    Tokens are separated by spaces and parentheses only.
+    """
+    return _TOKEN.findall(text)
+
+
+def _fired(rule):
+    if COLLECTOR != None:
+        COLLECTOR.rule(rule)
+
+
+def _reason(error):
+    return '%s: %s' % (type(error).__name__, error)
+
+
+def _exception(name, message):
+    """Return an exception of the builtin type called name, or an
+    Exception if there is none.
+    """
+    error = getattr(builtins, name, None)
+    if not (isinstance(error, type) and issubclass(error, Exception)):
+        error = Exception
+    return error(message) if message else error()
+
+
+def _compile_pattern(pattern):
+    """Compile a pattern of labels such as 'ADVP* VB ADVP* PP|ADJP|VP'.
+
+    Labels are separated by spaces, '|' separates alternatives, '*' repeats
+    a label zero or more times and '_' matches any label.
+    """
+    regex = []
+    for item in pattern.split():
+        repeat = '*' if item.endswith('*') else ''
+        item = item.rstrip('*')
+        if item == '_':
+            alternatives = r'\S+'
+        else:
+            alternatives = '|'.join(re.escape(label) for label in item.split('|'))
+        regex.append('(?:(?:%s) )%s' % (alternatives, repeat))
+    return re.compile(''.join(regex))
+
+
+class _RuleTable(object):
+    """Ordered restructuring rules dispatched on a sequence of child labels.
+
+    A rule is (pattern, WH labels or None for any, handler). The patterns
+    are compiled once. The rules matching a WH label and a label sequence
+    are then memoized, so a tree of a known shape finds its candidates
+    with one dict lookup. A handler returns None to let the next candidate
+    try, error is raised when none is left.
+    """
+
+    MAX_INDEX = 4096
+
+    def __init__(self, name, rules, error):
+        self.rules = [('%s: %s' % (name, pattern), _compile_pattern(pattern),
+                       WH and frozenset(WH), handler)
+                      for pattern, WH, handler in rules]
+        self.error = error
+        self.index = {}
+
+    def match(self, WH, labels):
+        """Return (name, handler) of the rules matching WH and labels, in order."""
+        key = (WH, labels)
+        rules = self.index.get(key)
+        if rules == None:
+            text = ''.join(label + ' ' for label in labels)
+            rules = tuple((name, handler) for name, regex, WHs, handler in self.rules
+                          if (WHs == None or WH in WHs) and regex.fullmatch(text))
+            if len(self.index) < self.MAX_INDEX:
+                self.index[key] = rules
+        return rules
+
 
 class POSTree(object):
     """Penn Treebank style tree."""
 
+    VB_TAG = frozenset(('VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ', 'MD'))
+    VB_WORD = frozenset(('do', 'does', 'can', 'could', 'would', 'should',
+            'might', 'has', 'have', "'ve", 'is', "'s", 'are', "'re", 'was', 'were'))
+
     class Node(object):
+        __slots__ = ('token', 'parent', 'first_child', 'last_child',
+                'prev_sibling', 'next_sibling')
+
         def __init__(self, token):
             self.token = token
+            self.parent = None
             self.first_child = None
+            self.last_child = None
+            self.prev_sibling = None
             self.next_sibling = None
 
         def __repr__(self):
             return '<%s>' % (self.token,)
 
-    def __init__(self, text):
+    # tokens of a lazy tree whose root is not built yet, and the labels of
+    # the children of its root, of the first child of its root and of each
+    # of the children of that one
+    __tokens = None
+    __top = None
+
+    def __init__(self, text, question=True, lazy=False):
         """Create a Penn Treebacnk style tree from plaint text.
 
         Using child-sibling representation.
 
-        text: the output from stanford parser.
+        text: the output from stanford parser, a str or UTF-8 encoded
+            bytes, bytearray or memoryview.
+        question: join the words into self.question, else it is None.
+            Conversion does not need it.
+        lazy: only check the text and gather the words, self.root and
+            self.question are built on first use. adjust_order() rejects
+            an unknown question structure, or answers a question from its
+            words alone, without building the tree.
         """
         
+        collector = COLLECTOR
+        if collector != None:
+            start = time.perf_counter()
+        if not isinstance(text, str):
+            text = str(text, 'utf-8')
         self.raw_text = text
         self.text = text.replace('\n', '')
-        self.text_length = len(self.text)
-        self.text_pointer = 0
         self.words = []
-        self.root = self.__create_tree()
-        self.question = ' '.join(self.__gather_word(self.root))
-        self.VB_TAG = ('VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ', 'MD')
-        self.VB_WORD = ('do', 'does', 'can', 'could', 'would', 'should', 
-                'might', 'has', 'have', "'ve", 'is', "'s", 'are', "'re", 'was', 'were')
-
-    def __create_tree(self):
-        parent = None
-        token = self.__next_token()
-        if token == '(':
-            token = self.__next_token()
-            parent = self.Node(token)
-            parent.first_child = self.__create_tree()
-            child = parent.first_child
-            if child != None:
-                while True:
-                    child.next_sibling = self.__create_tree()
-                    child = child.next_sibling
-                    if child == None:
-                        break
-        elif token != ')':
-            parent = self.Node(token.lower())
-            self.words.append(token.lower())
+        tokens = tokenize(self.text)
+        if collector != None:
+            start = collector.lap('tokenize', start)
+        if lazy:
+            self.words, top, first, below, leads = self.__scan(tokens)
+            self.__tokens = tokens
+            self.__top = (top, first, below, leads)
+            if collector != None:
+                collector.lap('scan', start)
+            return
+        self.root = self.__create_tree(tokens, self.words)
+        if collector != None:
+            start = collector.lap('build', start)
+        self.question = None
+        if question:
+            self.question = ' '.join(self.__gather_word(self.root))
+            if collector != None:
+                collector.lap('gather words', start)
+
+    @classmethod
+    def from_compact(cls, tree):
+        """Create a tree from a CompactTree without parsing any text.
+
+        raw_text and text are None for such a tree.
+        """
+        self = cls.__new__(cls)
+        self.raw_text = None
+        self.text = None
+        self.root = tree.to_node(cls.Node)
+        self.words = self.__gather_word(self.root)
+        self.question = ' '.join(self.words)
+        return self
+
+    @classmethod
+    def from_tuple(cls, tree):
+        """Create a tree from nested tuples without parsing any text.
+
+        tree: (label, child, ...) where a child is such a tuple or a word,
+            e.g. ('ROOT', ('SQ', ('VBZ', 'Is'), ...)). Lists work as well.
+
+        raw_text and text are None for such a tree.
+        """
+        return cls.__from_nested(tree, lambda node: (node[0], itertools.islice(node, 1, None)))
 
-        return parent
+    @classmethod
+    def from_nltk(cls, tree):
+        """Create a tree from an nltk.Tree without parsing any text.
 
-    def __next_token(self):
-        end = self.text_pointer
-        while end < self.text_length and self.text[end] == ' ':
-            end += 1
+        raw_text and text are None for such a tree.
+        """
+        return cls.__from_nested(tree, lambda node: (node.label(), node))
 
-        if end == self.text_length:
+    @classmethod
+    def __from_nested(cls, tree, split):
+        """split(node) returns the label and the children of a node, a
+        child which is a str is a word.
+        """
+        self = cls.__new__(cls)
+        self.raw_text = None
+        self.text = None
+        self.words = words = []
+        Node = cls.Node
+        if isinstance(tree, str):
+            self.root = Node(tree.lower())
+            words.append(self.root.token)
+            self.question = ' '.join(words)
+            return self
+        labels = _LABELS
+        label, children = split(tree)
+        self.root = Node(labels.get(label, label))
+        # iterators over the children still to create, with their parent
+        stack = [(iter(children), self.root)]
+        while stack:
+            children, parent = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+            if isinstance(child, str):
+                node = Node(child.lower())
+                words.append(node.token)
+            else:
+                label, children = split(child)
+                node = Node(labels.get(label, label))
+                stack.append((iter(children), node))
+            node.parent = parent
+            last = parent.last_child
+            if last == None:
+                parent.first_child = node
+            else:
+                last.next_sibling = node
+                node.prev_sibling = last
+            parent.last_child = node
+        self.question = ' '.join(words)
+        return self
+
+    def compact(self, labels=None):
+        """Return the tree as a CompactTree, see CompactTree.from_node()."""
+        return CompactTree.from_node(self.root, labels)
+
+    def __del__(self):
+        # break the cycles of the nodes, see __release(), a lazy tree is
+        # not built for it
+        self.__release(self.__dict__.get('root'))
+
+    def copy(self):
+        """Return a copy of the tree which can be converted without
+        changing this one.
+        """
+        tree = self.__class__.__new__(self.__class__)
+        tree.raw_text = self.raw_text
+        tree.text = self.text
+        tree.words = list(self.words)
+        # a lazy tree leaves what it has not built to the copy
+        tree.__tokens = self.__tokens
+        tree.__top = self.__top
+        if 'question' in self.__dict__:
+            tree.question = self.question
+        if 'root' in self.__dict__:
+            tree.root = self.__copy_tree(self.root)
+        return tree
+
+    def __copy_tree(self, tree):
+        if tree == None:
             return None
-
-        if self.text[end] in ('(', ')'):
-            token = self.text[end]
-            end += 1
+        Node = self.Node
+        root = Node(tree.token)
+        stack = [(tree, root)]
+        while stack:
+            node, parent = stack.pop()
+            prev = None
+            child = node.first_child
+            while child != None:
+                copy = Node(child.token)
+                copy.parent = parent
+                if prev == None:
+                    parent.first_child = copy
+                else:
+                    prev.next_sibling = copy
+                    copy.prev_sibling = prev
+                parent.last_child = copy
+                prev = copy
+                if child.first_child != None:
+                    stack.append((child, copy))
+                child = child.next_sibling
+        return root
+
+    def __getattr__(self, name):
+        # only called for the root and the question of a lazy tree, until
+        # they are built
+        tokens = self.__tokens
+        if tokens == None or name not in ('root', 'question'):
+            raise AttributeError("'%s' object has no attribute '%s'"
+                                 % (type(self).__name__, name))
+        if name == 'root':
+            self.root = self.__create_tree(tokens, [])
         else:
-            start = end
-            end += 1
-            while end < self.text_length and self.text[end] not in ('(', ')', ' '):
-                end += 1
-            token = self.text[start:end]
-        self.text_pointer = end
-        return token
+            tree = self.__create_tree(tokens, [])
+            self.question = ' '.join(self.__gather_word(tree))
+            self.__release(tree)
+        return self.__dict__[name]
+
+    def is_empty(self):
+        """Return True if the text held no tree, or a tree of one node."""
+        if self.__top != None and 'root' not in self.__dict__:
+            return not self.__top[0]
+        return self.root == None or self.root.first_child == None
+
+    def signature(self):
+        """Return the structure adjust_order() dispatches on.
+
+        That is (label of the question, label of its WH phrase, labels of
+        the children of its SQ) with None for what the tree has not. The
+        SQ is the S of an SBAR question, its labels are those the rules
+        match: what follows the period of an SQ question is left out and
+        VB*/MD children, or preterminals of an auxiliary word, are given
+        as 'VB'. A lazy tree answers without building its nodes.
+        """
+        if self.__top != None and 'root' not in self.__dict__:
+            top, first, below, leads = self.__top
+        else:
+            top = first = None
+            below = []
+            leads = []
+            if self.root != None and self.root.first_child != None:
+                child = self.root.first_child
+                top = [child.token]
+                first = []
+                child = child.first_child
+                while child != None:
+                    first.append(child.token)
+                    below.append([])
+                    leads.append([])
+                    grandchild = child.first_child
+                    while grandchild != None:
+                        below[-1].append(grandchild.token)
+                        leads[-1].append(grandchild.first_child
+                                         and grandchild.first_child.token)
+                        grandchild = grandchild.next_sibling
+                    child = child.next_sibling
+        if not top:
+            return (None, None, None)
+        label = top[0]
+        WH = SQ = None
+        if label == 'SQ':
+            # the period and what follows are dropped before dispatch
+            end = first.index('.') if '.' in first else len(first)
+            SQ = first[:end]
+            SQ_leads = [labels[0] if labels else None for labels in below[:end]]
+        elif label in ('SBARQ', 'SBAR') and first:
+            i = 0
+            if first[0] in ('WHADJP', 'WHNP', 'WHADVP', 'WHPP'):
+                WH = first[0]
+                i = 1
+            if i < len(first) and first[i] == ('SQ' if label == 'SBARQ' else 'S'):
+                SQ = below[i]
+                SQ_leads = leads[i]
+        if SQ != None:
+            VB_TAG = self.VB_TAG
+            VB_WORD = self.VB_WORD
+            SQ = tuple('VB' if child in VB_TAG or lead in VB_WORD else child
+                       for child, lead in zip(SQ, SQ_leads))
+        return (label, WH, SQ)
+
+    @classmethod
+    def classify(cls, signature):
+        """Return what a signature() tells of the conversion of its trees.
+
+        MALFORMED for an empty tree, UNSUPPORTED when adjust_order() fails
+        on any tree of that structure, None when it may succeed, which
+        only the words and the deeper levels decide.
+        """
+        label, WH, SQ = signature
+        if label == None:
+            return MALFORMED
+        if label == 'FRAG':
+            # a "how many" fragment
+            return None
+        if label == 'SQ' or (label == 'SBARQ' and WH == None):
+            if SQ and SQ[0] == 'VB' and 'NP' in SQ:
+                return None
+            return UNSUPPORTED
+        if label not in ('SBARQ', 'SBAR') or WH == None or SQ == None:
+            return UNSUPPORTED
+        if label == 'SBAR' and WH != 'WHADJP':
+            return UNSUPPORTED
+        # the rules applied after the SQ ones see an SQ they restructured
+        if not cls.__SBARQ_SQ_RULES.match(WH, SQ):
+            return UNSUPPORTED
+        return None
+
+    def __scan(self, tokens):
+        """Check tokens like __create_tree() without creating any node.
+
+        Return the words, the labels of the children of the root, the
+        labels of the children of its first child, None if there is no
+        root, a list of the labels of the children of each of these, and
+        a list of the labels of the first children of each of the latter,
+        None for a word. A word stands for itself among the labels.
+        """
+        words = []
+        top = []
+        first = []
+        below = []
+        leads = []
+        if not tokens or tokens[0] == ')':
+            return words, None, None, below, leads
+        if tokens[0] != '(':
+            words.append(tokens[0].lower())
+            return words, top, first, below, leads
+        tokens = iter(tokens)
+        # skip the root and its label
+        next(tokens)
+        next(tokens, None)
+        depth = 1
+        for token in tokens:
+            if token == ')':
+                depth -= 1
+                if depth == 0:
+                    return words, top, first, below, leads
+                continue
+            if token == '(':
+                label = next(tokens, None)
+            else:
+                label = token.lower()
+                words.append(label)
+            if depth == 1:
+                top.append(label)
+            elif depth == 2 and len(top) == 1:
+                first.append(label)
+                below.append([])
+                leads.append([])
+            elif depth == 3 and len(top) == 1:
+                below[-1].append(label)
+                leads[-1].append(None)
+            elif depth == 4 and len(top) == 1 and leads[-1][-1] == None:
+                leads[-1][-1] = label
+            if token == '(':
+                depth += 1
+        raise ValueError('Unbalanced parse tree!')
+
+    def __create_tree(self, tokens, words):
+        tokens = iter(tokens)
+        Node = self.Node
+        token = next(tokens, None)
+        if token != '(':
+            if token == None or token == ')':
+                return None
+            words.append(token.lower())
+            return Node(token.lower())
+
+        labels = _LABELS
+        label = next(tokens, None)
+        root = Node(labels.get(label, label))
+        # nodes of the open parentheses
+        stack = [root]
+        for token in tokens:
+            if token == ')':
+                stack.pop()
+                if not stack:
+                    return root
+                continue
+            if token == '(':
+                label = next(tokens, None)
+                node = Node(labels.get(label, label))
+            else:
+                token = token.lower()
+                node = Node(token)
+                words.append(token)
+            parent = node.parent = stack[-1]
+            last = parent.last_child
+            if last == None:
+                parent.first_child = node
+            else:
+                last.next_sibling = node
+                node.prev_sibling = last
+            parent.last_child = node
+            if token == '(':
+                stack.append(node)
+        # the nodes built link back to their parents
+        self.__release(root)
+        raise ValueError('Unbalanced parse tree!')
 
     def first_order_traverse(self):
         self.__first_order_traverse(self.root)
     def __first_order_traverse(self, tree):
-        if tree != None:
-            print(tree.token)
-            self.__first_order_traverse(tree.first_child)
-            if tree.first_child != None:
-                child = tree.first_child.next_sibling
-                while child != None:
-                    self.__first_order_traverse(child)
-                    child = child.next_sibling
+        stack = [tree] if tree != None else []
+        while stack:
+            node = stack.pop()
+            print(node.token)
+            if node is not tree and node.next_sibling != None:
+                stack.append(node.next_sibling)
+            if node.first_child != None:
+                stack.append(node.first_child)
+
+    def __release(self, node):
+        """Drop the parent and previous sibling links of node, of its next
+        siblings and of the nodes below them.
+
+        These links make every tree a reference cycle. Without them the
+        nodes are freed by reference counting as soon as they are dropped,
+        not by the cyclic garbage collector. A released tree keeps its
+        downward links, it can be walked but not restructured.
+        """
+        stack = [node] if node != None else []
+        while stack:
+            node = stack.pop()
+            while node != None:
+                node.parent = None
+                node.prev_sibling = None
+                if node.first_child != None:
+                    stack.append(node.first_child)
+                node = node.next_sibling
 
     def __delete_period(self):
+        """Drop the period and what follows, return the error, not raised,
+        if the question starts with it.
+        """
         child = self.root.first_child.first_child
-        assert(child.token != '.')
+        if child.token == '.':
+            return AssertionError('Period at the start of the question!')
         while child.next_sibling.token != '.':
             child = child.next_sibling
+        # drop the period and everything after it
+        self.__release(child.next_sibling)
         child.next_sibling = None
+        child.parent.last_child = child
 
-    def __check_PP(self, prenode, node):
+    def __check_PP(self, node):
         while node != None and node.token in ('PP', ',', 'SBAR'):
-            prenode = node
             node = node.next_sibling
-        return prenode, node
+        return node
+
+    def adjust_order(self, inplace=True):
+        """Return the question as a statement.
+
+        The tree is restructured in place, so it can be converted only
+        once. With inplace=False a copy is converted and the tree is left
+        as it is.
+        """
+        if not inplace:
+            return self.copy().adjust_order()
+        statement, error = self.__adjust_order()
+        if error != None:
+            try:
+                raise error
+            finally:
+                # its traceback holds this frame, a cycle through error
+                del error
+        return statement
 
-    def adjust_order(self):
+    def convert_result(self, inplace=True):
+        """Like adjust_order() but return a Result instead of raising.
+
+        An unknown question structure is reported without raising at all.
+        """
+        if not inplace:
+            return self.copy().convert_result()
+        try:
+            statement, error = self.__adjust_order()
+        except Exception as e:
+            return Result(UNSUPPORTED, None, _reason(e))
+        if error != None:
+            return Result(UNSUPPORTED, None, _reason(error))
+        return Result(OK, statement, None)
+
+    def write_statement(self, write, inplace=True):
+        """Convert the question like adjust_order(), passing the words of
+        the statement and the spaces between them to write.
+
+        write: a function taking a str, such as the write method of a text
+            file or of an io.StringIO.
+
+        The words are written as the restructured tree is walked, no list
+        or string of the statement is built. Nothing is written when the
+        conversion fails.
+        """
+        if not inplace:
+            return self.copy().write_statement(write)
+        statement, error = self.__adjust_order(join=False)
+        if error != None:
+            try:
+                raise error
+            finally:
+                del error
+        if statement != None:
+            write(statement)
+            return
+        words = self.__iter_words(self.root)
+        for word in words:
+            write(word)
+            break
+        for word in words:
+            write(' ')
+            write(word)
+
+    def __adjust_order(self, join=True):
+        """Return (statement, None), or (None, error) when the question
+        structure is unknown or no rule applies to it. Other failures are
+        raised.
+
+        With join=False the statement of a restructured tree is left in
+        it, (None, None) is returned.
+        """
+        if self.__top != None and 'root' not in self.__dict__:
+            decided = self.__decide(*self.__top[:2])
+            if decided != None:
+                return decided
+        collector = COLLECTOR
+        if collector != None:
+            start = time.perf_counter()
+        # the WH phrase taken out of the tree, released with it at the end
+        WH = None
         try:
             child = self.root.first_child
             if child.token == 'FRAG' and ' '.join(self.words[:2]) == 'how many':
+                _fired('question: FRAG how many')
                 words = ['there', 'are', '**blank**'] + self.words[2:-1]
-                return ' '.join(words)
+                return (' '.join(words), None)
 
-            self.__delete_period()
-            assert(child.next_sibling == None)
+            error = self.__delete_period()
+            if error == None and child.next_sibling != None:
+                error = AssertionError('More than one phrase in the question!')
+            if error != None:
+                return (None, self.__failed(error))
             if child.token == 'SQ':
-                self.__adjust_SQ_question(child)
+                _fired('question: SQ')
+                error = self.__adjust_SQ_question(child)
             elif child.token == 'SBARQ':
-                prefirst = child
                 first = child.first_child
                 second = first.next_sibling
                 if first.token == 'SQ' and second == None:
-                    self.__adjust_SQ_question(first)
+                    _fired('question: SBARQ = SQ')
+                    error = self.__adjust_SQ_question(first)
                 elif (first.token in ('WHADJP', 'WHNP', 'WHADVP', 'WHPP')
                         and second.token == 'SQ'):
-                    WH = self.__delete_tree(prefirst, first)
-                    self.__adjust_SBARQ_question(WH, second)
+                    _fired('question: SBARQ = %s + SQ' % first.token)
+                    WH = self.__delete_tree(first)
+                    error = self.__adjust_SBARQ_question(WH, second)
                 else:
-                    raise ValueError('Unknown question structure!')
+                    return (None, self.__failed(ValueError('Unknown question structure!')))
             elif child.token == 'SBAR':
                 if (child.first_child.token == 'WHADJP'
                         and child.first_child.next_sibling.token == 'S'
                         and ' '.join(self.words[:2]) == 'how many'):
+                    _fired('question: SBAR how many')
                     SQ = child.first_child.next_sibling
-                    WH = self.__delete_tree(child, child.first_child)
-                    self.__adjust_SBARQ_question(WH, SQ)
+                    WH = self.__delete_tree(child.first_child)
+                    error = self.__adjust_SBARQ_question(WH, SQ)
                 else:
-                    raise ValueError('Unknown question structure!')
+                    return (None, self.__failed(ValueError('Unknown question structure!')))
             else:
-                raise ValueError('Unknown question structure!')
-            words = self.__gather_word(self.root)
-            words = filter(lambda w: w != '', words)
-            statement = ' '.join(words)
+                return (None, self.__failed(ValueError('Unknown question structure!')))
+            if error != None:
+                return (None, self.__failed(error))
+            if collector != None:
+                start = collector.lap('restructure', start)
+            if not join:
+                return (None, None)
+            statement = ' '.join(self.__iter_words(self.root))
+            if collector != None:
+                collector.lap('join', start)
         except Exception as e:
-            if DEBUG:
+            raise self.__failed(e)
+        finally:
+            if WH != None:
+                self.__release(WH)
+        return (statement, None)
+
+    def __decide(self, top, first):
+        """Return what __adjust_order() gives from the labels of the two
+        top levels, or None if the tree is needed.
+        """
+        # the checks of __adjust_order() up to the restructuring, any
+        # other failure is left to it
+        if not top:
+            return None
+        if top[0] == 'FRAG' and ' '.join(self.words[:2]) == 'how many':
+            _fired('question: FRAG how many')
+            words = ['there', 'are', '**blank**'] + self.words[2:-1]
+            return (' '.join(words), None)
+        if not first or first[0] == '.' or '.' not in first or len(top) != 1:
+            return None
+        first = first[:first.index('.')]
+        if top[0] == 'SQ':
+            return None
+        if top[0] == 'SBARQ':
+            if first[0] == 'SQ' and len(first) == 1:
+                return None
+            if first[0] in ('WHADJP', 'WHNP', 'WHADVP', 'WHPP'):
+                if len(first) == 1 or first[1] == 'SQ':
+                    return None
+        elif top[0] == 'SBAR':
+            if first[0] == 'WHADJP':
+                if len(first) == 1 or (first[1] == 'S'
+                        and ' '.join(self.words[:2]) == 'how many'):
+                    return None
+        return (None, self.__failed(ValueError('Unknown question structure!')))
+
+    def __failed(self, error):
+        if COLLECTOR != None:
+            COLLECTOR.failure(_reason(error))
+        if DEBUG:
+            if self.question != None:
                 print(self.question)
-                print(self.raw_text)
-            raise e
-        return statement
+            print(self.raw_text)
+        return error
 
     def __create_answer_node(self, before_text='', after_text=''):
         node = self.Node('A')
@@ -149,7 +751,7 @@ class POSTree(object):
             answer = '%s %s' % (before_text, answer)
         if after_text != '':
             answer = '%s %s' % (answer, after_text)
-        node.first_child = self.Node(answer)
+        self.__insert_as_first_child(self.Node(answer), node)
         return node
 
     def __check_VB(self, node):
@@ -161,65 +763,102 @@ class POSTree(object):
         return False
 
     def __adjust_SQ_question(self, SQ):
+        """Restructure SQ, return None or the error, not raised, when it
+        does not start with VB*/MD.
+        """
         VB = SQ.first_child
-        assert(self.__check_VB(VB))
+        if not self.__check_VB(VB):
+            return AssertionError('First child of SQ is not VB*/MD!')
+        # move answer after first NP
+        NP = VB.next_sibling
+        while NP.token != 'NP':
+            NP = NP.next_sibling
+
         auxiliary = VB.first_child.token
         if auxiliary not in ('do', 'did', 'does'):
             answer = self.__create_answer_node(before_text=auxiliary)
         else:
             answer = self.__create_answer_node()
-
-        # move answer after first NP
-        NP = VB.next_sibling
-        while NP.token != 'NP':
-            NP = NP.next_sibling
         self.__insert_after(answer, NP)
-        self.__delete_tree(SQ, VB)
-        return SQ
+        self.__release(self.__delete_tree(VB))
+        return None
 
     def __gather_word(self, tree):
         words = []
-        def recursor(t):
-            if t == None:
-                return
-            if t.first_child == None:
-                words.append(t.token)
+        stack = [tree] if tree != None else []
+        while stack:
+            node = stack.pop()
+            if node is not tree and node.next_sibling != None:
+                stack.append(node.next_sibling)
+            if node.first_child == None:
+                words.append(node.token)
             else:
-                recursor(t.first_child)
-                sibling = t.first_child.next_sibling
-                while sibling != None:
-                    recursor(sibling)
-                    sibling = sibling.next_sibling
-        recursor(tree)
+                stack.append(node.first_child)
         return words
 
+    def __iter_words(self, tree):
+        """Yield the words of tree like __gather_word(), but the empty ones."""
+        stack = [tree] if tree != None else []
+        while stack:
+            node = stack.pop()
+            if node is not tree and node.next_sibling != None:
+                stack.append(node.next_sibling)
+            if node.first_child == None:
+                if node.token != '':
+                    yield node.token
+            else:
+                stack.append(node.first_child)
+
     def __tree_to_text(self, tree):
-        words = []
-        def recursor(t):
-            if t == None:
-                return
-            if t.first_child == None:
-                words.append(' '+t.token)
+        return ''.join(self.__iter_text(tree))
+
+    def __iter_text(self, tree):
+        """Yield the pieces of __tree_to_text(tree) as the tree is walked."""
+        # None marks the closing parenthesis of a node
+        stack = [tree] if tree != None else []
+        while stack:
+            node = stack.pop()
+            if node == None:
+                yield ')'
+                continue
+            if node is not tree and node.next_sibling != None:
+                stack.append(node.next_sibling)
+            if node.first_child == None:
+                yield ' '+node.token
             else:
-                words.append('('+t.token)
-                recursor(t.first_child)
-                sibling = t.first_child.next_sibling
-                while sibling != None:
-                    recursor(sibling)
-                    sibling = sibling.next_sibling
-                words.append(')')
-        recursor(tree)
-        return ''.join(words)
+                yield '('+node.token
+                stack.append(None)
+                stack.append(node.first_child)
+
+    def __text_startswith(self, tree, prefix):
+        """Return __tree_to_text(tree).startswith(prefix).
+
+        The tree is only walked until the prefix is matched or mismatched.
+        """
+        if not prefix:
+            return True
+        end = 0
+        for piece in self.__iter_text(tree):
+            start = end
+            end += len(piece)
+            if prefix[start:end] != piece[:len(prefix) - start]:
+                return False
+            if end >= len(prefix):
+                return True
+        return False
 
     def __convert_WH_to_answer(self, WH):
         words = self.__gather_word(WH)
         WH_text = ' '.join(words)
         if WH_text == 'how old':
-            WH.first_child = self.__create_answer_node(after_text='years old')
+            _fired('WH: how old')
+            self.__replace_children(WH, self.__create_answer_node(after_text='years old'))
         elif WH_text == 'why':
-            WH.first_child = self.__create_answer_node(before_text='because')
+            _fired('WH: why')
+            self.__replace_children(WH, self.__create_answer_node(before_text='because'))
         elif WH.token in ('WHADJP', 'WHADVP'):
-            WH.first_child = self.__create_answer_node()
+            _fired('WH: %s' % WH.token)
+            self.__replace_children(WH, self.__create_answer_node())
         elif WH.token == 'WHNP' or WH.token == 'WHPP' and WH.first_child.next_sibling.token == 'WHNP':
             parent = WH if WH.token == 'WHNP' else WH.first_child.next_sibling
             first = WH.first_child
@@ -227,95 +866,163 @@ class POSTree(object):
                 parent = first
                 first = first.first_child
             if first.token == 'WHADJP':
-                first.first_child = self.__create_answer_node()
-            elif self.__tree_to_text(parent).startswith('(WHNP(WDT what)(NN color)(NN'):
+                _fired('WH: WHNP = WHADJP + ...')
+                self.__replace_children(first, self.__create_answer_node())
+            elif self.__text_startswith(parent, '(WHNP(WDT what)(NN color)(NN'):
+                _fired('WH: WHNP = what color + NN')
                 after_text = ' '.join(self.__gather_word(parent)).replace('what color ', '', 1)
-                parent.first_child = self.__create_answer_node(after_text=after_text)
+                self.__replace_children(parent, self.__create_answer_node(after_text=after_text))
             else:
-                parent.first_child = self.__create_answer_node()
+                _fired('WH: %s' % WH.token)
+                self.__replace_children(parent, self.__create_answer_node())
         else:
-            raise ValueError('Unknown WH structure!')
+            return ValueError('Unknown WH structure!')
         return WH
 
-    def __check_ADVP(self, prenode, node):
+    def __check_ADVP(self, node):
         while node != None and node.token == 'ADVP':
-            prenode = node
             node = node.next_sibling
-        return prenode, node
+        return node
 
-    def __delete_tree(self, prenode, node):
+    def __delete_tree(self, node):
         if node == None:
             return node
-        if prenode.first_child == node:
-            prenode.first_child = node.next_sibling
+        parent = node.parent
+        if node.prev_sibling == None:
+            parent.first_child = node.next_sibling
+        else:
+            node.prev_sibling.next_sibling = node.next_sibling
+        if node.next_sibling == None:
+            parent.last_child = node.prev_sibling
         else:
-            prenode.next_sibling = node.next_sibling
+            node.next_sibling.prev_sibling = node.prev_sibling
+        node.parent = None
+        node.prev_sibling = None
         node.next_sibling = None
         return node
 
-    def __delete_node(self, prenode, node):
+    def __delete_node(self, node):
+        """Replace node by its children."""
         if node == None:
             return node
-        if prenode.first_child == node:
-            if node.first_child == None:
-                prenode.first_child = node.next_sibling
-            else:
-                prenode.first_child = node.first_child
-                lc = node.first_child
-                while lc.next_sibling != None:
-                    lc = lc.next_sibling
-                lc.next_sibling = node.next_sibling
-                node.first_child = None
+        first = node.first_child
+        if first == None:
+            return self.__delete_tree(node)
+        last = node.last_child
+        parent = node.parent
+        child = first
+        while child != None:
+            child.parent = parent
+            child = child.next_sibling
+        first.prev_sibling = node.prev_sibling
+        if node.prev_sibling == None:
+            parent.first_child = first
         else:
-            if node.first_child == None:
-                prenode.next_sibling = node.next_sibling
-            else:
-                prenode.next_sibling = node.first_child
-                lc = node.first_child
-                while lc.next_sibling != None:
-                    lc = lc.next_sibling
-                lc.next_sibling = node.next_sibling
-                node.first_child = None
+            node.prev_sibling.next_sibling = first
+        last.next_sibling = node.next_sibling
+        if node.next_sibling == None:
+            parent.last_child = last
+        else:
+            node.next_sibling.prev_sibling = last
+        node.first_child = None
+        node.last_child = None
+        node.parent = None
+        node.prev_sibling = None
         node.next_sibling = None
         return node
 
     def __insert_after(self, srcnode, dstnode):
         assert(srcnode != None and dstnode != None)
+        srcnode.parent = dstnode.parent
+        srcnode.prev_sibling = dstnode
         srcnode.next_sibling = dstnode.next_sibling
+        if dstnode.next_sibling == None:
+            dstnode.parent.last_child = srcnode
+        else:
+            dstnode.next_sibling.prev_sibling = srcnode
         dstnode.next_sibling = srcnode
         return srcnode
 
     def __insert_as_first_child(self, srcnode, dstnode):
         assert(srcnode != None and dstnode != None)
+        srcnode.parent = dstnode
+        srcnode.prev_sibling = None
         srcnode.next_sibling = dstnode.first_child
+        if dstnode.first_child == None:
+            dstnode.last_child = srcnode
+        else:
+            dstnode.first_child.prev_sibling = srcnode
         dstnode.first_child = srcnode
         return srcnode
 
     def __insert_as_last_child(self, srcnode, dstnode):
         assert(srcnode != None and dstnode != None)
-        lc = dstnode.first_child
-        if lc == None:
-            self.__insert_as_first_child(srcnode, dstnode)
-        else:
-            while lc.next_sibling != None:
-                lc = lc.next_sibling
-            self.__insert_after(srcnode, lc)
-        return srcnode
+        if dstnode.last_child == None:
+            return self.__insert_as_first_child(srcnode, dstnode)
+        return self.__insert_after(srcnode, dstnode.last_child)
+
+    def __replace_children(self, node, child):
+        """Make child the only child of node."""
+        self.__release(node.first_child)
+        node.first_child = None
+        node.last_child = None
+        return self.__insert_as_first_child(child, node)
+
+    def __SQ_labels(self, SQ):
+        """Return the labels of the children of SQ, VB*/MD ones as 'VB'.
+
+        Like __check_VB, a preterminal of an auxiliary word counts as VB*,
+        but the tree is left untouched: only the handlers relabel nodes.
+        """
+        labels = []
+        child = SQ.first_child
+        while child != None:
+            if child.token in self.VB_TAG or (child.first_child != None
+                                              and child.first_child.token in self.VB_WORD):
+                labels.append('VB')
+            else:
+                labels.append(child.token)
+            child = child.next_sibling
+        return tuple(labels)
+
+    def __locate(self, SQ):
+        """Return (first, second, third), the first children of SQ which
+        are not ADVP.
+        """
+        first = self.__check_ADVP(SQ.first_child)
+        second = third = None
+        if first != None:
+            second = self.__check_ADVP(first.next_sibling)
+        if second != None:
+            third = self.__check_ADVP(second.next_sibling)
+        return first, second, third
+
+    def __apply_rules(self, rules, SQ, WH):
+        """Restructure SQ with the first of rules which applies.
+
+        Return SQ, or the error, not raised, when no rule applies. A handler
+        returning an error, from rules it applies in turn, ends the search.
+        """
+        nodes = self.__locate(SQ)
+        for name, handler in rules.match(WH.token, self.__SQ_labels(SQ)):
+            result = handler(self, SQ, WH, nodes)
+            if isinstance(result, Exception):
+                return result
+            if result != None:
+                _fired(name)
+                return result
+        return ValueError(rules.error)
 
     def __adjust_SQ_in_SBARQ(self, SQ, WH):
-        prefirst, first = self.__check_ADVP(SQ, SQ.first_child)
-        
-        # SQ = VP
-        if first.token == 'VP':
-            return SQ
+        return self.__apply_rules(self.__SBARQ_SQ_RULES, SQ, WH)
 
-        # SQ = NP + VP
-        if (first.token == 'NP' and first.next_sibling != None 
-                and first.next_sibling.token == 'VP' and first.next_sibling.next_sibling == None):
-            return SQ
+    def __keep_SQ(self, SQ, WH, nodes):
+        return SQ
 
-        if not self.__check_VB(first):
-            raise ValueError('First child of SQ in SBARQ is not VB*/MD')
+    def __normalize_VB(self, SQ, WH, nodes):
+        first, second, _ = nodes
+        # relabel an auxiliary preterminal VB before its word is rewritten
+        self.__check_VB(first)
 
         # process 's 're 've
         if first.first_child.token == "'s":
@@ -325,8 +1032,6 @@ class POSTree(object):
         elif first.first_child.token == "'ve":
             first.first_child.token = 'have'
 
-        presecond, second = self.__check_ADVP(first, first.next_sibling)
-
         # SQ = VB* + [ADVP]
         if second == None:
             return SQ
@@ -337,254 +1042,205 @@ class POSTree(object):
                 first.first_child.token = 'can not'
             else:
                 first.first_child.token += ' not'
-            self.__delete_tree(presecond, second)
-            presecond, second = self.__check_ADVP(first, first.next_sibling)
+            self.__release(self.__delete_tree(second))
         else:
             if first.first_child.token in ('do', 'does', 'did'):
                 first.first_child.token = ''
 
-        # SQ = VB*+PP/ADJP/VP
-        if second.next_sibling == None and second.token in ('PP', 'ADJP', 'VP'):
-            return SQ
-        
+        return self.__apply_rules(self.__SBARQ_VB_RULES, SQ, WH)
+
+    def __move_VB_into_NP(self, SQ, WH, nodes):
         # SQ = VB* + NP
         #      |     |
         #     first second
-        if second.token == 'NP' and second.next_sibling == None:
-            fc = second.first_child
-
-            # second = NP + ?
-            #          |    |
-            #          fc   sc
-            if (fc.token == 'NP' and fc.next_sibling != None
-                    and fc.next_sibling.next_sibling == None):
-                sc = fc.next_sibling
-                if ((sc.token == 'PP' and WH.token == 'WHADVP')
-                        or (sc.token == 'PP' and sc.first_child.token == 'IN' 
-                            and sc.first_child.next_sibling == None)
-                        or (sc.token == 'NP' and ' '.join(self.__gather_word(fc)) == 'there')
-                        or (sc.token == 'ADJP')
-                        or (sc.token == 'SBAR' and sc.first_child.token == 'WHADVP')):
-                    self.__delete_node(presecond, second)
-                    VB = self.__delete_tree(prefirst, first)
-                    self.__insert_after(VB, fc)
-                    return SQ
-            VB = self.__delete_tree(prefirst, first)
-            self.__insert_after(VB, second)
-            return SQ
-
-        # SQ = VB* + NP + ? 
-        #      |     |    |
-        #    first second third
-        if second.token == 'NP' and second.next_sibling != None:
-            prethird, third = self.__check_ADVP(second, second.next_sibling)
-            # SQ = VB* + NP + ADVP
-            if third == None:
-                VB = self.__delete_tree(prefirst, first)
-                self.__insert_after(VB, second)
+        first, second, _ = nodes
+        fc = second.first_child
+
+        # second = NP + ?
+        #          |    |
+        #          fc   sc
+        if (fc.token == 'NP' and fc.next_sibling != None
+                and fc.next_sibling.next_sibling == None):
+            sc = fc.next_sibling
+            if ((sc.token == 'PP' and WH.token == 'WHADVP')
+                    or (sc.token == 'PP' and sc.first_child.token == 'IN'
+                        and sc.first_child.next_sibling == None)
+                    or (sc.token == 'NP' and ' '.join(self.__gather_word(fc)) == 'there')
+                    or (sc.token == 'ADJP')
+                    or (sc.token == 'SBAR' and sc.first_child.token == 'WHADVP')):
+                self.__delete_node(second)
+                VB = self.__delete_tree(first)
+                self.__insert_after(VB, fc)
                 return SQ
+        VB = self.__delete_tree(first)
+        self.__insert_after(VB, second)
+        return SQ
 
-            if third.next_sibling == None:
-                if ((third.token in ('ADJP', 'PP', 'NP', 'VP'))
-                        or (third.token == 'S' 
-                            and self.__tree_to_text(third).startswith('(S(VP(TO to)(VP(VB'))):
-                    VB = self.__delete_tree(prefirst, first)
-                    self.__insert_after(VB, second)
-                    return SQ
+    def __move_VB_after_NP(self, SQ, WH, nodes):
+        first, second, _ = nodes
+        VB = self.__delete_tree(first)
+        self.__insert_after(VB, second)
+        return SQ
 
-        raise ValueError('Unknown SQ structure in SBARQ!')
+    def __move_VB_before_S(self, SQ, WH, nodes):
+        third = nodes[2]
+        if self.__text_startswith(third, '(S(VP(TO to)(VP(VB'):
+            return self.__move_VB_after_NP(SQ, WH, nodes)
+        return None
 
     def __prefix_by_to_WH(self, WH):
         BY = self.Node('BY')
-        BY.first_child = self.Node('by')
+        self.__insert_as_first_child(self.Node('by'), BY)
         self.__insert_as_first_child(BY, WH)
         return WH
 
     def __insert_WH_into_SQ(self, WH, SQ):
         if self.words[0] == 'why':
+            _fired('WH into SQ: why')
             self.__insert_as_last_child(WH, SQ)
             return SQ
+        return self.__apply_rules(self.__WH_INTO_SQ_RULES, SQ, WH)
 
-        prefirst, first = self.__check_ADVP(SQ, SQ.first_child)
-
-        if first.next_sibling == None:
-            # SQ = VP
-            if first.token == 'VP':
-                self.__insert_as_first_child(WH, SQ)
-                return SQ
-
-            # SQ = NP
-            if first.token == 'NP':
-                self.__insert_after(WH, first)
-                return SQ
+    def __WH_first(self, SQ, WH, nodes):
+        self.__insert_as_first_child(WH, SQ)
+        return SQ
 
-            # SQ = VB*
-            if self.__check_VB(first):
-                self.__insert_as_first_child(WH, SQ)
-                return SQ
+    def __WH_after_first(self, SQ, WH, nodes):
+        self.__insert_after(WH, nodes[0])
+        return SQ
 
-            raise ValueError('Unknown SQ structure!')
+    def __WH_after_second(self, SQ, WH, nodes):
+        self.__insert_after(WH, nodes[1])
+        return SQ
 
-        presecond, second = self.__check_ADVP(first, first.next_sibling)
+    def __WH_after_third(self, SQ, WH, nodes):
+        self.__insert_after(WH, nodes[2])
+        return SQ
 
-        # SQ = VB* + ADVP
-        if self.__check_VB(first) and second == None:
-            self.__insert_as_first_child(WH, SQ)
+    def __WH_into_VP(self, SQ, WH, nodes):
+        # SQ = NP + VB* + VP
+        #      |    |     |
+        #   first second third
+        _, VB, VP = nodes
+        while (self.__check_VB(VP.first_child) and VP.first_child.next_sibling != None
+                and VP.first_child.next_sibling.token == 'VP'):
+            VB = VP.first_child
+            VP = VB.next_sibling
+        # VP = VBN + [...]
+        #      |
+        #      fc
+        fc = self.__check_ADVP(VP.first_child)
+        if ((VB.first_child.token != ''
+                and VB.first_child.token.split()[0] in ('is', 'are', 'was', 'were'))
+                and fc.token == 'VBN'):
+            if WH.token == 'WHADVP' and self.words[0] == 'how':
+                _fired('WH into VP = VBN, how')
+                WH = self.__prefix_by_to_WH(WH)
+                self.__insert_after(WH, VP)
+                return SQ
+            if WH.token == 'WHADVP' and self.words[0] in ('why', 'where'):
+                _fired('WH into VP = VBN, why/where')
+                self.__insert_after(WH, VP)
+                return SQ
+        # VP = VB*
+        #      |
+        #      fc
+        if self.__check_VB(fc) and fc.next_sibling == None:
+            _fired('WH into VP = VB*')
+            self.__insert_after(WH, VP)
             return SQ
-
-        # SQ = VB* + VP/PP/ADJP
+        # VP = VB* + ?
         #      |     |
-        #    first  second
-        if (self.__check_VB(first) and second.next_sibling == None 
-                and second.token in ('VP', 'PP', 'ADJP')):
-            self.__insert_as_first_child(WH, SQ)
-            return SQ
-
-        prethird, third = self.__check_ADVP(second, second.next_sibling)
-
-        # SQ = NP + VB* + [ADVP]
-        #      |    |      
-        #    first second 
-        if (first.token == 'NP' and self.__check_VB(second) and 
-                (second.next_sibling == None or third == None)):
-            self.__insert_after(WH, second)
-            return SQ
-
-        # SQ = NP + VP
-        #      |    |
-        #    first second
-        if (first.token == 'NP' and second.token == 'VP' 
-                and second.next_sibling == None):
-            if WH.token in ('WHNP', 'WHADJP'):
-                self.__insert_as_first_child(WH, SQ)
-                return SQ
-            if WH.token  == 'WHPP':
-                self.__insert_after(WH, second)
+        #      fc    sc
+        if (self.__check_VB(fc) and fc.next_sibling != None
+                and fc.next_sibling.next_sibling == None):
+            sc = fc.next_sibling
+            # VP = VB* + PRT
+            if sc.token == 'PRT':
+                _fired('WH into VP = VB* + PRT')
+                self.__insert_after(WH, VP)
                 return SQ
-
-        if third == None:
-            raise ValueError('Unknown SQ structure!')
-
-        # SQ = NP + VB* + ?
-        #      |    |     |
-        #   first second third
-        if first.token == 'NP' and self.__check_VB(second) and third.next_sibling == None:
-
-            # SQ = NP + VB* + VP
-            if third.token == 'VP':
-                VB = second
-                VP = third
-                while (self.__check_VB(VP.first_child) and VP.first_child.next_sibling != None
-                        and VP.first_child.next_sibling.token == 'VP'):
-                    VB = VP.first_child
-                    VP = VB.next_sibling
-                # VP = VBN + [...]
-                #      |
-                #      fc
-                _, fc = self.__check_ADVP(VP, VP.first_child)
-                if ((VB.first_child.token != '' 
-                        and VB.first_child.token.split()[0] in ('is', 'are', 'was', 'were'))
-                        and fc.token == 'VBN'):
-                    if WH.token == 'WHADVP' and self.words[0] == 'how':
-                        WH = self.__prefix_by_to_WH(WH)
-                        self.__insert_after(WH, VP)
-                        return SQ
-                    if WH.token == 'WHADVP' and self.words[0] in ('why', 'where'):
-                        self.__insert_after(WH, VP)
-                        return SQ
-                # VP = VB*
-                #      |
-                #      fc
-                if self.__check_VB(fc) and fc.next_sibling == None:
+            # VP = VB* + PP
+            if sc.token == 'PP':
+                ffc = sc.first_child
+                if ffc.token == 'IN' and ffc.next_sibling == None:
+                    _fired('WH into VP = VB* + PP(IN)')
                     self.__insert_after(WH, VP)
                     return SQ
-                # VP = VB* + ?
-                #      |     |
-                #      fc    sc
-                if (self.__check_VB(fc) and fc.next_sibling != None
-                        and fc.next_sibling.next_sibling == None):
-                    sc = fc.next_sibling
-                    # VP = VB* + PRT
-                    if sc.token == 'PRT':
-                        self.__insert_after(WH, VP)
-                        return SQ
-                    # VP = VB* + PP
-                    if sc.token == 'PP':
-                        ffc = sc.first_child
-                        if ffc.token == 'IN' and ffc.next_sibling == None:
-                            self.__insert_after(WH, VP)
-                            return SQ
-                        if (ffc.token == 'IN' and ffc.next_sibling != None
-                                and ffc.next_sibling.next_sibling == None):
-                            ssc = ffc.next_sibling
-                            if ssc.token in ('NP', 'ADJP'):
-                                self.__insert_after(WH, fc)
-                                return SQ
-                    # VP = VB* + SBAR
-                    if sc.token == 'SBAR':
-                        if fc.first_child.token in ('know', 'think'):
-                            if WH.token == 'WHADVP' and self.words[0] == 'how':
-                                WH = self.__prefix_by_to_WH(WH)
-                                self.__insert_after(WH, VP)
-                                return SQ
-                            self.__insert_after(WH, VP)
-                            return SQ
+                if (ffc.token == 'IN' and ffc.next_sibling != None
+                        and ffc.next_sibling.next_sibling == None):
+                    ssc = ffc.next_sibling
+                    if ssc.token in ('NP', 'ADJP'):
+                        _fired('WH into VP = VB* + PP(IN + NP/ADJP)')
                         self.__insert_after(WH, fc)
                         return SQ
-                    # VP = VB* + S
-                    if sc.token == 'S' and self.__tree_to_text(sc).startswith('(S(VP(TO to)(VP(VB'):
-                        VB_S = sc.first_child.first_child.next_sibling.first_child
-                        if VB_S.next_sibling == None:
-                            self.__insert_after(WH, VP)
-                            return SQ
-                        if (VB_S.next_sibling.token == 'SBAR' 
-                                and VB_S.next_sibling.first_child.token == 'WHADVP'):
-                            self.__insert_after(WH, VB_S)
-                            return SQ
-                        self.__insert_after(WH, fc)
-                        return SQ
-                    # VP = VB* + ADVP
-                    if sc.token == 'ADVP':
-                        self.__insert_after(WH, fc)
+            # VP = VB* + SBAR
+            if sc.token == 'SBAR':
+                if fc.first_child.token in ('know', 'think'):
+                    if WH.token == 'WHADVP' and self.words[0] == 'how':
+                        _fired('WH into VP = know/think + SBAR, how')
+                        WH = self.__prefix_by_to_WH(WH)
+                        self.__insert_after(WH, VP)
                         return SQ
-
-                if WH.token == 'WHADVP' and self.words[0] == 'how':
-                    WH = self.__prefix_by_to_WH(WH)
+                    _fired('WH into VP = know/think + SBAR')
                     self.__insert_after(WH, VP)
                     return SQ
-                self.__insert_after(WH, VP)
-                return SQ
-
-            # SQ = NP + VB* + NP
-            if third.token == 'NP':
-                self.__insert_after(WH, third)
+                _fired('WH into VP = VB* + SBAR')
+                self.__insert_after(WH, fc)
                 return SQ
-            # SQ = NP + VB* + S
-            if third.token == 'S' and self.__tree_to_text(third).startswith('(S(VP(TO to)(VP(VB'):
-                VB_S = third.first_child.first_child.next_sibling.first_child
-                if VB_S.next_sibling == None and WH.token == 'WHNP':
+            # VP = VB* + S
+            if sc.token == 'S' and self.__text_startswith(sc, '(S(VP(TO to)(VP(VB'):
+                VB_S = sc.first_child.first_child.next_sibling.first_child
+                if VB_S.next_sibling == None:
+                    _fired('WH into VP = VB* + S(to VB)')
+                    self.__insert_after(WH, VP)
+                    return SQ
+                if (VB_S.next_sibling.token == 'SBAR'
+                        and VB_S.next_sibling.first_child.token == 'WHADVP'):
+                    _fired('WH into VP = VB* + S(to VB + SBAR)')
                     self.__insert_after(WH, VB_S)
                     return SQ
-                self.__insert_after(WH, second)
-                return SQ
-            # SQ = NP + VB* + SBAR
-            if third.token == 'SBAR' and third.first_child.token == 'WHADVP':
-                self.__insert_after(WH, second)
+                _fired('WH into VP = VB* + S')
+                self.__insert_after(WH, fc)
                 return SQ
-            # SQ = NP + VB* + PP
-            if third.token == 'PP':
-                self.__insert_after(WH, third)
-                return SQ
-            # SQ = NP + VB* + ADJP
-            if third.token == 'ADJP':
-                if WH.token == 'WHADVP' and self.words[0] == 'how':
-                    WH = self.__prefix_by_to_WH(WH)
-                    self.__insert_after(WH, third)
-                    return SQ
-                self.__insert_after(WH, third)
+            # VP = VB* + ADVP
+            if sc.token == 'ADVP':
+                _fired('WH into VP = VB* + ADVP')
+                self.__insert_after(WH, fc)
                 return SQ
 
-        raise ValueError('Unknown SQ structure!')
+        if WH.token == 'WHADVP' and self.words[0] == 'how':
+            _fired('WH into VP, how')
+            WH = self.__prefix_by_to_WH(WH)
+            self.__insert_after(WH, VP)
+            return SQ
+        _fired('WH into VP')
+        self.__insert_after(WH, VP)
+        return SQ
+
+    def __WH_into_S(self, SQ, WH, nodes):
+        # SQ = NP + VB* + S
+        _, second, third = nodes
+        if not self.__text_startswith(third, '(S(VP(TO to)(VP(VB'):
+            return None
+        VB_S = third.first_child.first_child.next_sibling.first_child
+        if VB_S.next_sibling == None and WH.token == 'WHNP':
+            self.__insert_after(WH, VB_S)
+            return SQ
+        self.__insert_after(WH, second)
+        return SQ
+
+    def __WH_before_SBAR(self, SQ, WH, nodes):
+        # SQ = NP + VB* + SBAR
+        if nodes[2].first_child.token != 'WHADVP':
+            return None
+        return self.__WH_after_second(SQ, WH, nodes)
+
+    def __WH_after_ADJP(self, SQ, WH, nodes):
+        # SQ = NP + VB* + ADJP
+        if WH.token == 'WHADVP' and self.words[0] == 'how':
+            WH = self.__prefix_by_to_WH(WH)
+        return self.__WH_after_third(SQ, WH, nodes)
 
     def __adjust_SBARQ_question(self, WH, SQ):
         """Adjust word order of SBARQ question.
@@ -593,12 +1249,1082 @@ class POSTree(object):
           1. __convert_WH_to_answer();
           2. __adjust_SQ_in_SBARQ();
           3. __insert_WH_into_SQ().
+
+        Return None, or the error of the first step which fails, not raised.
         """
         #WH = self.root.first_child.first_child
         #SQ = WH.next_sibling
 
         WH = self.__convert_WH_to_answer(WH)
+        if isinstance(WH, Exception):
+            return WH
         SQ = self.__adjust_SQ_in_SBARQ(SQ, WH)
+        if isinstance(SQ, Exception):
+            return SQ
         SQ = self.__insert_WH_into_SQ(WH, SQ)
+        if isinstance(SQ, Exception):
+            return SQ
+        return None
+
+    # Rules over the children of SQ, see _RuleTable. 'VB' stands for any
+    # VB*/MD child.
+    __SBARQ_SQ_RULES = _RuleTable('SQ in SBARQ', (
+        ('ADVP* VP _*', None, __keep_SQ),                   # SQ = VP
+        ('ADVP* NP VP', None, __keep_SQ),                   # SQ = NP + VP
+        ('ADVP* VB _*', None, __normalize_VB),
+    ), 'First child of SQ in SBARQ is not VB*/MD')
+
+    # Applied by __normalize_VB once RB(not) is removed.
+    __SBARQ_VB_RULES = _RuleTable('VB in SQ', (
+        ('ADVP* VB ADVP* PP|ADJP|VP', None, __keep_SQ),     # SQ = VB* + PP/ADJP/VP
+        ('ADVP* VB ADVP* NP', None, __move_VB_into_NP),     # SQ = VB* + NP
+        ('ADVP* VB ADVP* NP ADVP*', None, __move_VB_after_NP),
+        ('ADVP* VB ADVP* NP ADVP* ADJP|PP|NP|VP', None, __move_VB_after_NP),
+        ('ADVP* VB ADVP* NP ADVP* S', None, __move_VB_before_S),
+    ), 'Unknown SQ structure in SBARQ!')
+
+    __WH_INTO_SQ_RULES = _RuleTable('WH into SQ', (
+        ('ADVP* VP', None, __WH_first),                     # SQ = VP
+        ('ADVP* NP', None, __WH_after_first),               # SQ = NP
+        ('ADVP* VB ADVP*', None, __WH_first),               # SQ = VB* + [ADVP]
+        ('ADVP* VB ADVP* VP|PP|ADJP', None, __WH_first),    # SQ = VB* + VP/PP/ADJP
+        ('ADVP* NP ADVP* VB ADVP*', None, __WH_after_second),   # SQ = NP + VB* + [ADVP]
+        ('ADVP* NP ADVP* VP', ('WHNP', 'WHADJP'), __WH_first),  # SQ = NP + VP
+        ('ADVP* NP ADVP* VP', ('WHPP',), __WH_after_second),
+        ('ADVP* NP ADVP* VB ADVP* VP', None, __WH_into_VP),     # SQ = NP + VB* + ?
+        ('ADVP* NP ADVP* VB ADVP* NP', None, __WH_after_third),
+        ('ADVP* NP ADVP* VB ADVP* S', None, __WH_into_S),
+        ('ADVP* NP ADVP* VB ADVP* SBAR', None, __WH_before_SBAR),
+        ('ADVP* NP ADVP* VB ADVP* PP', None, __WH_after_third),
+        ('ADVP* NP ADVP* VB ADVP* ADJP', None, __WH_after_ADJP),
+    ), 'Unknown SQ structure!')
+
+
+class RuleStats(object):
+    """Collector of rule hits, failure reasons and time spent per stage.
+
+    Set the module attribute COLLECTOR to an instance to record every
+    conversion into it:
+
+        import POSTree
+        POSTree.COLLECTOR = POSTree.RuleStats()
+        ...
+        print(POSTree.COLLECTOR.report())
+    """
+
+    STAGES = ('tokenize', 'scan', 'build', 'gather words', 'restructure', 'join')
+
+    def __init__(self):
+        self.rules = collections.Counter()
+        self.failures = collections.Counter()
+        self.seconds = collections.Counter()
+        self.calls = collections.Counter()
+        self.__lock = threading.Lock()
+
+    def rule(self, name):
+        """Record that the rule name fired."""
+        with self.__lock:
+            self.rules[name] += 1
+
+    def failure(self, reason):
+        """Record a conversion which failed with reason."""
+        with self.__lock:
+            self.failures[reason] += 1
+
+    def lap(self, stage, start):
+        """Record the time elapsed since start in stage and return now."""
+        now = time.perf_counter()
+        with self.__lock:
+            self.seconds[stage] += now - start
+            self.calls[stage] += 1
+        return now
+
+    def report(self):
+        """Return the statistics as text, most frequent first."""
+        lines = ['stage            calls    total s  mean us']
+        for stage in self.STAGES:
+            if self.calls[stage]:
+                lines.append('%-12s %9d %10.3f %8.1f'
+                             % (stage, self.calls[stage], self.seconds[stage],
+                                self.seconds[stage] / self.calls[stage] * 1e6))
+        for title, counter in (('rule', self.rules), ('failure', self.failures)):
+            lines.append('')
+            lines.append('%9s  %s' % ('count', title))
+            for name, count in counter.most_common():
+                lines.append('%9d  %s' % (count, name))
+        return '\n'.join(lines)
+
+
+class LabelTable(object):
+    """Interned strings, each identified by a small integer."""
+
+    def __init__(self, strings=()):
+        """strings: the first strings of the table, string i gets id i."""
+        self.strings = []
+        self.ids = {}
+        self.lock = threading.Lock()
+        for string in strings:
+            self.intern(string)
+
+    def intern(self, string):
+        """Return the id of string, adding it to the table if needed."""
+        id_ = self.ids.get(string)
+        if id_ == None:
+            with self.lock:
+                id_ = self.ids.get(string)
+                if id_ == None:
+                    id_ = len(self.strings)
+                    self.strings.append(string)
+                    self.ids[string] = id_
+        return id_
+
+
+class CompactTree(object):
+    """Penn Treebank style tree stored in parallel integer arrays.
+
+    Node i has the token labels.strings[label[i]], the first child
+    first_child[i] and the next sibling next_sibling[i], -1 standing for
+    no node. Labels and words are interned in a LabelTable, so a node
+    costs 12 bytes. The labels of PTB_LABELS have fixed ids, their
+    position in it. Nodes removed from the tree keep their slots.
+
+    By default the table is CompactTree.labels, shared by all trees. It
+    keeps every word it is given for the life of the process, so trees
+    of a large or open vocabulary are better given their own table, one
+    per corpus such as LabelTable(PTB_LABELS), freed along with them.
+    """
+
+    labels = LabelTable(PTB_LABELS)
+
+    def __init__(self, labels=None):
+        """labels: the LabelTable to intern into, CompactTree.labels if
+            None. It has to start with PTB_LABELS.
+        """
+        if labels != None:
+            self.labels = labels
+        self.root = -1
+        self.label = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+
+    def __len__(self):
+        return len(self.label)
+
+    @classmethod
+    def from_text(cls, text, labels=None):
+        """Create a tree from the output of stanford parser.
 
-        self.root.first_child.first_child = SQ
+        labels: the LabelTable of the tree, see CompactTree().
+        """
+        tree = cls(labels)
+        tokens = iter(tokenize(text.replace('\n', '')))
+        token = next(tokens, None)
+        if token != '(':
+            if token != None and token != ')':
+                tree.root = tree.new_node(token.lower())
+            return tree
+
+        first_child = tree.first_child
+        next_sibling = tree.next_sibling
+        tree.root = tree.new_node(next(tokens, None))
+        # [node, last child] of every open parenthesis
+        stack = [[tree.root, -1]]
+        for token in tokens:
+            if token == ')':
+                stack.pop()
+                if not stack:
+                    return tree
+                continue
+            if token == '(':
+                node = tree.new_node(next(tokens, None))
+            else:
+                node = tree.new_node(token.lower())
+            top = stack[-1]
+            if top[1] == -1:
+                first_child[top[0]] = node
+            else:
+                next_sibling[top[1]] = node
+            top[1] = node
+            if token == '(':
+                stack.append([node, -1])
+        raise ValueError('Unbalanced parse tree!')
+
+    @classmethod
+    def from_node(cls, root, labels=None):
+        """Create a tree from a POSTree.Node and its descendants.
+
+        labels: the LabelTable of the tree, see CompactTree().
+        """
+        tree = cls(labels)
+        if root == None:
+            return tree
+        tree.root = tree.new_node(root.token)
+        stack = [(root, tree.root)]
+        while stack:
+            node, parent = stack.pop()
+            prev = -1
+            child = node.first_child
+            while child != None:
+                i = tree.new_node(child.token)
+                if prev == -1:
+                    tree.first_child[parent] = i
+                else:
+                    tree.next_sibling[prev] = i
+                prev = i
+                if child.first_child != None:
+                    stack.append((child, i))
+                child = child.next_sibling
+        return tree
+
+    def to_node(self, Node=POSTree.Node):
+        """Return the root of a copy of the tree made of Node objects."""
+        if self.root == -1:
+            return None
+        strings = self.labels.strings
+        root = Node(strings[self.label[self.root]])
+        stack = [(self.root, root)]
+        while stack:
+            i, parent = stack.pop()
+            prev = None
+            child = self.first_child[i]
+            while child != -1:
+                node = Node(strings[self.label[child]])
+                node.parent = parent
+                if prev == None:
+                    parent.first_child = node
+                else:
+                    prev.next_sibling = node
+                    node.prev_sibling = prev
+                parent.last_child = node
+                prev = node
+                if self.first_child[child] != -1:
+                    stack.append((child, node))
+                child = self.next_sibling[child]
+        return root
+
+    def new_node(self, token):
+        """Append a node without links and return its index."""
+        self.label.append(self.labels.intern(token))
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        return len(self.label) - 1
+
+    def token(self, node):
+        return self.labels.strings[self.label[node]]
+
+    def words(self, node=None):
+        """Return the words under node, the root by default."""
+        node = self.root if node == None else node
+        strings = self.labels.strings
+        words = []
+        stack = [node] if node != -1 else []
+        while stack:
+            i = stack.pop()
+            if i != node and self.next_sibling[i] != -1:
+                stack.append(self.next_sibling[i])
+            if self.first_child[i] == -1:
+                words.append(strings[self.label[i]])
+            else:
+                stack.append(self.first_child[i])
+        return words
+
+    def to_text(self, node=None):
+        """Serialize the tree under node the same way as POSTree does."""
+        node = self.root if node == None else node
+        strings = self.labels.strings
+        words = []
+        # -1 marks the closing parenthesis of a node
+        stack = [node] if node != -1 else []
+        while stack:
+            i = stack.pop()
+            if i == -1:
+                words.append(')')
+                continue
+            if i != node and self.next_sibling[i] != -1:
+                stack.append(self.next_sibling[i])
+            if self.first_child[i] == -1:
+                words.append(' '+strings[self.label[i]])
+            else:
+                words.append('('+strings[self.label[i]])
+                stack.append(-1)
+                stack.append(self.first_child[i])
+        return ''.join(words)
+
+    def delete_tree(self, prenode, node):
+        """Detach node and its descendants, return node.
+
+        prenode: the parent of node if node is its first child, else the
+            previous sibling of node, the nodes holding no parent links.
+        """
+        if node == -1:
+            return node
+        if self.first_child[prenode] == node:
+            self.first_child[prenode] = self.next_sibling[node]
+        else:
+            self.next_sibling[prenode] = self.next_sibling[node]
+        self.next_sibling[node] = -1
+        return node
+
+    def delete_node(self, prenode, node):
+        """Replace node by its children, return node. See delete_tree()."""
+        if node == -1:
+            return node
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        replacement = first_child[node]
+        if replacement == -1:
+            replacement = next_sibling[node]
+        else:
+            lc = replacement
+            while next_sibling[lc] != -1:
+                lc = next_sibling[lc]
+            next_sibling[lc] = next_sibling[node]
+            first_child[node] = -1
+        if first_child[prenode] == node:
+            first_child[prenode] = replacement
+        else:
+            next_sibling[prenode] = replacement
+        next_sibling[node] = -1
+        return node
+
+    def insert_after(self, srcnode, dstnode):
+        assert(srcnode != -1 and dstnode != -1)
+        self.next_sibling[srcnode] = self.next_sibling[dstnode]
+        self.next_sibling[dstnode] = srcnode
+        return srcnode
+
+    def insert_as_first_child(self, srcnode, dstnode):
+        assert(srcnode != -1 and dstnode != -1)
+        self.next_sibling[srcnode] = self.first_child[dstnode]
+        self.first_child[dstnode] = srcnode
+        return srcnode
+
+    def insert_as_last_child(self, srcnode, dstnode):
+        assert(srcnode != -1 and dstnode != -1)
+        lc = self.first_child[dstnode]
+        if lc == -1:
+            return self.insert_as_first_child(srcnode, dstnode)
+        while self.next_sibling[lc] != -1:
+            lc = self.next_sibling[lc]
+        return self.insert_after(srcnode, lc)
+
+
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+class ConversionCache(object):
+    """Bounded LRU cache of conversions keyed on the parse text.
+
+    The key is the text with newlines removed, like POSTree.text. Both
+    statements and errors are cached, an error is raised again on a hit.
+    """
+
+    def __init__(self, maxsize=1024):
+        """maxsize: number of entries kept, the least recently used ones
+        are evicted first. None keeps every entry.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def convert(self, text):
+        """Return POSTree(text).adjust_order(), from the cache if possible."""
+        key = text.replace('\n', '')
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry != None:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry == None:
+            try:
+                entry = (True, POSTree(text).adjust_order())
+            except Exception as e:
+                entry = (False, (type(e), e.args))
+            with self.__lock:
+                self.__entries[key] = entry
+                while self.maxsize != None and len(self.__entries) > self.maxsize:
+                    self.__entries.popitem(last=False)
+        succeeded, value = entry
+        if not succeeded:
+            error, args = value
+            raise error(*args)
+        return value
+
+    def info(self):
+        """Return the hit and miss counts, maxsize and current size."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.__entries))
+
+    def clear(self):
+        """Remove every entry and reset the statistics."""
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class DiskCache(object):
+    """Persistent cache of conversions stored in a sqlite3 database.
+
+    The key is the SHA-1 hash of the parse text with newlines removed. The
+    statement or the error raised by adjust_order() is stored, an error is
+    raised again on a hit. Writes are committed in batches, at the latest
+    COMMIT_AFTER seconds after the first of a batch on the next write,
+    and on close(), which a cache dropped without it calls when freed:
+
+        with DiskCache('conversions.db') as cache:
+            statement = convert(text, cache)
+    """
+
+    COMMIT_EVERY = 256
+    COMMIT_AFTER = 5.0
+
+    def __init__(self, path, maxsize=1000000, version=RULES_VERSION):
+        """path: the database file, created if needed.
+        maxsize: number of entries kept, the oldest ones are evicted
+            first. None keeps every entry.
+        version: stamp of the rules, entries written under another stamp
+            are dropped.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__pending = 0
+        self.__committed = time.monotonic()
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute('CREATE TABLE IF NOT EXISTS meta '
+                          '(key TEXT PRIMARY KEY, value TEXT)')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS conversions '
+                          '(hash BLOB UNIQUE, statement TEXT, error TEXT, message TEXT)')
+        row = self.__db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row == None or row[0] != str(version):
+            self.__db.execute('DELETE FROM conversions')
+            self.__db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                              (str(version),))
+            self.__db.commit()
+        self.__size = self.__db.execute('SELECT COUNT(*) FROM conversions').fetchone()[0]
+
+    def __len__(self):
+        return self.__size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def convert(self, text):
+        """Return POSTree(text).adjust_order(), from the cache if possible."""
+        key = hashlib.sha1(text.replace('\n', '').encode('utf-8')).digest()
+        with self.__lock:
+            row = self.__db.execute('SELECT statement, error, message FROM conversions '
+                                    'WHERE hash = ?', (key,)).fetchone()
+            if row != None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if row == None:
+            try:
+                row = (POSTree(text).adjust_order(), None, None)
+            except Exception as e:
+                row = (None, type(e).__name__, str(e))
+            self.__store(key, row)
+        statement, error, message = row
+        if error != None:
+            raise _exception(error, message)
+        return statement
+
+    def __store(self, key, row):
+        with self.__lock:
+            cursor = self.__db.execute('INSERT OR IGNORE INTO conversions VALUES (?, ?, ?, ?)',
+                                       (key,) + row)
+            self.__size += cursor.rowcount
+            if self.maxsize != None and self.__size > self.maxsize:
+                cursor = self.__db.execute(
+                    'DELETE FROM conversions WHERE rowid IN '
+                    '(SELECT rowid FROM conversions ORDER BY rowid LIMIT ?)',
+                    (self.__size - self.maxsize,))
+                self.__size -= cursor.rowcount
+            if self.__pending == 0:
+                self.__committed = time.monotonic()
+            self.__pending += 1
+            if (self.__pending >= self.COMMIT_EVERY
+                    or time.monotonic() - self.__committed >= self.COMMIT_AFTER):
+                self.__db.commit()
+                self.__pending = 0
+
+    def info(self):
+        """Return the hit and miss counts, maxsize and current size."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, self.__size)
+
+    def clear(self):
+        """Remove every entry and reset the statistics."""
+        with self.__lock:
+            self.__db.execute('DELETE FROM conversions')
+            self.__db.commit()
+            self.__size = 0
+            self.__pending = 0
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        """Commit the pending entries and close the database, once."""
+        with self.__lock:
+            if self.__db == None:
+                return
+            try:
+                self.__db.commit()
+            finally:
+                self.__db.close()
+                self.__db = None
+
+    def __del__(self):
+        # the pending entries of a cache dropped without close() are kept
+        if self.__dict__.get('_DiskCache__db') != None:
+            self.close()
+
+
+class Converter(object):
+    """Reusable engine converting parse trees into statements.
+
+    The tag classes and rule tables are constant data of the tree class,
+    so a Converter keeps no state between calls: each call parses its text
+    into a tree of its own, restructures it and drops it. One instance can
+    serve any number of threads at once, such as the workers of a
+    concurrent.futures.ThreadPoolExecutor.
+    """
+
+    def __init__(self, tree_class=POSTree, lazy=False):
+        """tree_class: POSTree or a subclass of it to parse trees with.
+        lazy: parse lazy trees, see POSTree().
+        """
+        self.tree_class = tree_class
+        self.lazy = lazy
+
+    def parse(self, text):
+        """Return the tree of text, without joining its question."""
+        return self.tree_class(text, question=False, lazy=self.lazy)
+
+    def convert(self, text):
+        """Return the statement of text, raise when it cannot be converted."""
+        return self.parse(text).adjust_order()
+
+    def write_statement(self, text, write):
+        """Pass the statement of text to write, see POSTree.write_statement()."""
+        self.parse(text).write_statement(write)
+
+    def convert_result(self, text):
+        """Return the Result of converting text, never raising.
+
+        status is OK with the statement, UNSUPPORTED when adjust_order()
+        fails or MALFORMED when no tree can be built from text, with the
+        reason as 'ExceptionType: message'.
+        """
+        try:
+            tree = self.parse(text)
+        except Exception as e:
+            return Result(MALFORMED, None, _reason(e))
+        if tree.is_empty():
+            return Result(MALFORMED, None, _reason(ValueError('Empty parse tree!')))
+        return tree.convert_result()
+
+
+_CONVERTER = Converter()
+
+Signatures = collections.namedtuple('Signatures', 'question WH SQ patterns')
+
+
+def structure_signatures(trees):
+    """Return the POSTree.signature() of every tree as integer columns.
+
+    question and WH hold the CompactTree.labels ids of the labels, SQ the
+    index of the SQ labels in patterns, -1 standing for None. The columns
+    are numpy arrays if numpy is installed, array('i') otherwise.
+    POSTree.classify() tells the unsupported ones from the signatures.
+    """
+    labels = CompactTree.labels
+    questions = array('i')
+    WHs = array('i')
+    SQs = array('i')
+    patterns = []
+    ids = {}
+    for tree in trees:
+        question, WH, SQ = tree.signature()
+        questions.append(-1 if question == None else labels.intern(question))
+        WHs.append(-1 if WH == None else labels.intern(WH))
+        if SQ == None:
+            SQs.append(-1)
+            continue
+        id_ = ids.get(SQ)
+        if id_ == None:
+            id_ = ids[SQ] = len(patterns)
+            patterns.append(SQ)
+        SQs.append(id_)
+    try:
+        import numpy
+    except ImportError:
+        return Signatures(questions, WHs, SQs, patterns)
+    questions = numpy.frombuffer(questions, dtype=numpy.intc)
+    WHs = numpy.frombuffer(WHs, dtype=numpy.intc)
+    SQs = numpy.frombuffer(SQs, dtype=numpy.intc)
+    return Signatures(questions, WHs, SQs, patterns)
+
+
+def structure_order(signatures):
+    """Return the indices of the trees of signatures sorted by structure,
+    so that the trees going through the same rules are next to each other.
+    """
+    try:
+        import numpy
+    except ImportError:
+        pass
+    else:
+        return numpy.lexsort((signatures.SQ, signatures.WH, signatures.question))
+    return sorted(range(len(signatures.question)), key=lambda i: (
+        signatures.question[i], signatures.WH[i], signatures.SQ[i]))
+
+
+def convert(text, cache=None):
+    """Convert the output of stanford parser into a statement.
+
+    cache: an optional ConversionCache or DiskCache to look the text up in.
+    """
+    if cache != None:
+        return cache.convert(text)
+    return _CONVERTER.convert(text)
+
+
+def convert_result(text):
+    """Convert the output of stanford parser into a Result, never raising.
+
+    See Converter.convert_result().
+    """
+    return _CONVERTER.convert_result(text)
+
+
+def _convert_chunk(texts, results=False):
+    if results:
+        return [convert_result(text) for text in texts]
+    return [convert(text) for text in texts]
+
+
+def iconvert_many(parses, workers=None, chunksize=64, results=False):
+    """Convert parse trees in a process pool and yield statements in input order.
+
+    parses: a list or any iterable of stanford parser outputs. It is
+        consumed lazily, at most 2 * workers chunks are in flight.
+    workers: number of worker processes, defaults to the number of CPUs.
+        With one worker the trees are converted in the calling process.
+    chunksize: number of trees sent to a worker at a time.
+    results: yield a Result for every tree, see convert_result(), so that
+        failing trees do not stop the batch.
+
+    Unless results is set, an exception raised by adjust_order() is
+    re-raised when the failing tree is reached.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for text in parses:
+            yield convert_result(text) if results else convert(text)
+        return
+    parses = iter(parses)
+    pending = collections.deque()
+    with multiprocessing.Pool(workers) as pool:
+        while True:
+            chunk = list(itertools.islice(parses, chunksize))
+            if chunk:
+                pending.append(pool.apply_async(_convert_chunk, (chunk, results)))
+            while pending and (not chunk or len(pending) >= 2 * workers):
+                for statement in pending.popleft().get():
+                    yield statement
+            if not chunk:
+                break
+
+
+def convert_many(parses, workers=None, chunksize=64, results=False):
+    """Convert parse trees in a process pool and return a list of statements.
+
+    See iconvert_many() for the arguments.
+    """
+    return list(iconvert_many(parses, workers, chunksize, results))
+
+
+class _SharedCorpus(object):
+    """Parse trees and their conversions in one shared memory block.
+
+    The block holds the offsets of the trees (n + 1 int64), the lengths
+    of the outputs (n int64), their status codes (n int8), the trees as
+    UTF-8 and the output arena, as large as the trees. The output of tree
+    i, its statement or failure reason, is written where tree i is in the
+    arena, an output which does not fit has the length -1. So has a tree
+    failing when exceptions are kept, its exception is then the output.
+    """
+
+    STATUSES = (OK, UNSUPPORTED, MALFORMED)
+
+    def __init__(self, memory, n, size):
+        self.memory = memory
+        self.n = n
+        self.size = size
+        buf = memory.buf
+        self.offsets = buf[:8 * (n + 1)].cast('q')
+        start = 8 * (n + 1)
+        self.lengths = buf[start:start + 8 * n].cast('q')
+        start += 8 * n
+        self.status = buf[start:start + n].cast('b')
+        start += n
+        self.texts = buf[start:start + size]
+        self.output = buf[start + size:start + 2 * size]
+
+    @classmethod
+    def create(cls, parses):
+        parses = [text.encode('utf-8') if isinstance(text, str) else bytes(text)
+                  for text in parses]
+        size = sum(map(len, parses))
+        memory = shared_memory.SharedMemory(
+            create=True, size=max(1, 17 * len(parses) + 8 + 2 * size))
+        corpus = cls(memory, len(parses), size)
+        offset = 0
+        for i, text in enumerate(parses):
+            corpus.offsets[i] = offset
+            corpus.texts[offset:offset + len(text)] = text
+            offset += len(text)
+        corpus.offsets[len(parses)] = offset
+        return corpus
+
+    def convert(self, start, stop, results=True):
+        """Convert trees start to stop - 1 into the arena, return the
+        outputs which do not fit by index.
+
+        With results=False the trees are converted like adjust_order(),
+        the conversion stops at the first failing tree and its exception
+        is returned as its output.
+        """
+        offsets = self.offsets
+        overflow = {}
+        for i in range(start, stop):
+            begin = offsets[i]
+            end = offsets[i + 1]
+            if results:
+                result = _CONVERTER.convert_result(self.texts[begin:end])
+            else:
+                try:
+                    result = Result(OK, _CONVERTER.convert(self.texts[begin:end]), None)
+                except Exception as e:
+                    self.lengths[i] = -1
+                    overflow[i] = e
+                    break
+            self.status[i] = self.STATUSES.index(result.status)
+            text = result.statement if result.status == OK else result.reason
+            data = text.encode('utf-8')
+            if len(data) <= end - begin:
+                self.output[begin:begin + len(data)] = data
+                self.lengths[i] = len(data)
+            else:
+                self.lengths[i] = -1
+                overflow[i] = text
+        return overflow
+
+    def result(self, i, overflow):
+        """Return the Result of tree i."""
+        status = self.STATUSES[self.status[i]]
+        length = self.lengths[i]
+        if length == -1:
+            text = overflow[i]
+        else:
+            begin = self.offsets[i]
+            text = str(self.output[begin:begin + length], 'utf-8')
+        if status == OK:
+            return Result(OK, text, None)
+        return Result(status, None, text)
+
+    def close(self):
+        for view in (self.offsets, self.lengths, self.status, self.texts, self.output):
+            view.release()
+        self.memory.close()
+
+
+# the _SharedCorpus of a worker process of iconvert_shared()
+_shared = None
+
+
+def _attach_shared(name, n, size):
+    global _shared
+    _shared = _SharedCorpus(shared_memory.SharedMemory(name), n, size)
+
+
+def _convert_shared(task):
+    return _shared.convert(*task)
+
+
+def iconvert_shared(parses, workers=None, chunksize=256, results=False):
+    """Convert parse trees in a process pool sharing memory with it, and
+    yield statements in input order.
+
+    The trees are copied once as UTF-8 into a shared memory block which
+    the workers read and write their statements back into, so only the
+    bounds of the chunks and the rare outputs which do not fit are pickled.
+    See iconvert_many() for the arguments, parses is read whole before
+    the conversion starts. With workers=1 the trees are converted in the
+    calling process by iconvert_many().
+
+    Unless results is set, the exception adjust_order() raised for the
+    first failing tree is raised again, pickled back from its worker.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from iconvert_many(parses, 1, chunksize, results)
+        return
+    corpus = _SharedCorpus.create(parses)
+    try:
+        tasks = [(start, min(start + chunksize, corpus.n), results)
+                 for start in range(0, corpus.n, chunksize)]
+        with multiprocessing.Pool(workers, _attach_shared,
+                                  (corpus.memory.name, corpus.n, corpus.size)) as pool:
+            for (start, stop, _), overflow in zip(tasks, pool.imap(_convert_shared, tasks)):
+                for i in range(start, stop):
+                    error = overflow.get(i)
+                    if isinstance(error, Exception):
+                        raise error
+                    result = corpus.result(i, overflow)
+                    yield result if results else result.statement
+    finally:
+        corpus.close()
+        corpus.memory.unlink()
+
+
+def convert_shared(parses, workers=None, chunksize=256, results=False):
+    """Convert parse trees in a process pool sharing memory with it, and
+    return a list of statements.
+
+    See iconvert_shared() for the arguments.
+    """
+    return list(iconvert_shared(parses, workers, chunksize, results))
+
+
+_PAREN = re.compile(r'[()]')
+# where a tree can start: a '(' opening a line or a '(ROOT'
+_TREE_START = re.compile(r'\n\(|\(ROOT')
+
+
+def iter_trees(stream, encoding='utf-8', chunk_size=1 << 16):
+    """Split the concatenated trees of a stanford parser output file.
+
+    stream: a text or binary file object, read chunk_size at a time.
+        Binary input is decoded with encoding.
+
+    Yields the text of each top-level tree, found by balancing the
+    parentheses. Text between trees is skipped. A tree left open, as by a
+    missing ')', ends where the next tree can start, at a '(' opening a
+    line or at a '(ROOT', or at the end of the stream. It is yielded as
+    it is, to fail parsing like any malformed tree, and the trees after
+    it are split as usual.
+    """
+    decoder = None
+    pieces = []
+    depth = 0
+    # text[1:cut] is scanned in a pass. The character before is the last
+    # one of the previous pass, to tell a line start, and the characters
+    # after are left to the next pass, to tell a '(ROOT'. A line starts
+    # at the start of the stream.
+    text = '\n'
+    cut = 1
+    while True:
+        chunk = stream.read(chunk_size)
+        end = not chunk
+        if not isinstance(chunk, str):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding)()
+            chunk = decoder.decode(chunk, end)
+        text = text[cut - 1:] + chunk
+        cut = len(text) if end else max(1, len(text) - 4)
+        bounds = []
+        for match in _TREE_START.finditer(text):
+            bound = match.start() + (text[match.start()] == '\n')
+            if bound >= cut:
+                break
+            if bound > 0:
+                bounds.append(bound)
+        bounds.append(cut)
+        start = pos = 1
+        for bound in bounds:
+            for match in _PAREN.finditer(text, pos, bound):
+                if match.group() == '(':
+                    if depth == 0:
+                        start = match.start()
+                    depth += 1
+                elif depth > 0:
+                    depth -= 1
+                    if depth == 0:
+                        pieces.append(text[start:match.end()])
+                        yield ''.join(pieces)
+                        pieces = []
+            if depth > 0 and bound < cut:
+                # an open tree cut short by the next one
+                pieces.append(text[start:bound])
+                yield ''.join(pieces)
+                pieces = []
+                depth = 0
+            pos = bound
+        if depth > 0:
+            pieces.append(text[start:cut])
+        if end:
+            break
+    if depth > 0:
+        yield ''.join(pieces)
+
+
+def iconvert_stream(stream, workers=1, chunksize=64, results=False):
+    """Convert every tree of a stanford parser output file, yielding statements.
+
+    See iter_trees() for stream and iconvert_many() for the other arguments.
+    """
+    return iconvert_many(iter_trees(stream), workers, chunksize, results)
+
+
+def _read_parses(stream, format, field, column):
+    """Yield the parse trees of a binary stream, see main() for the formats.
+
+    A line without a parse, a blank one included, gives '', which
+    converts as a malformed tree, so that outputs stay aligned with lines.
+    """
+    if format == 'raw':
+        yield from iter_trees(stream)
+        return
+    for line in iter(stream.readline, b''):
+        line = line.decode('utf-8').rstrip('\r\n')
+        if format == 'tsv':
+            columns = line.split('\t')
+            yield columns[column] if -len(columns) <= column < len(columns) else ''
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield ''
+            continue
+        if isinstance(record, dict):
+            record = record.get(field)
+        yield record if isinstance(record, str) else ''
+
+
+def _read_until_error(parses, errors):
+    """Yield parses until reading them fails, the error is appended to
+    errors so that the trees read before are still converted.
+    """
+    try:
+        yield from parses
+    except (OSError, ValueError) as e:
+        errors.append(e)
+
+
+def main(argv=None):
+    """Convert a file of parse trees into statements, one per line.
+
+    Usage: python -m POSTree [options] [input] [output]
+
+    The statements are written in input order, a tree which cannot be
+    converted leaves an empty line and goes to the --failures file as
+    'index<TAB>status<TAB>reason', index counting trees from 0. With the
+    jsonl and tsv formats every line is a tree, so output line i is the
+    statement of input line i. A tree which does not parse, such as one
+    cut short in a raw file, is malformed like any other.
+
+    Returns 0 once every tree is read and written, 1 if some are
+    malformed, if the input cannot be read to its end, after writing the
+    statements of the trees read before, or if the output was closed
+    early, as by | head.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m POSTree',
+        description='Convert parse trees of questions into statements.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='file of parse trees, - for stdin (default)')
+    parser.add_argument('output', nargs='?', default='-',
+                        help='file of statements, - for stdout (default)')
+    parser.add_argument('--format', choices=('raw', 'jsonl', 'tsv'), default='raw',
+                        help='raw: concatenated parser output (default), '
+                        'jsonl: one JSON string or object per line, '
+                        'tsv: tab separated columns')
+    parser.add_argument('--field', default='parse',
+                        help='key of the parse in JSON objects (default: parse)')
+    parser.add_argument('--column', type=int, default=-1,
+                        help='index of the parse in TSV columns (default: -1)')
+    parser.add_argument('--failures', help='file to write the failed trees to')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes, defaults to the number of CPUs')
+    parser.add_argument('--chunksize', type=int, default=64,
+                        help='trees sent to a worker at a time (default: 64)')
+    args = parser.parse_intermixed_args(argv)
+    if args.workers != None and args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.chunksize < 1:
+        parser.error('--chunksize must be at least 1')
+
+    buffering = 1 << 20
+    if args.input == '-':
+        source = None
+        stream = sys.stdin.buffer
+    else:
+        source = open(args.input, 'rb')
+        if os.fstat(source.fileno()).st_size > 0:
+            stream = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            stream = source
+    if args.output == '-':
+        output = sys.stdout
+    else:
+        output = open(args.output, 'w', encoding='utf-8', buffering=buffering)
+    failures = None
+    if args.failures != None:
+        failures = open(args.failures, 'w', encoding='utf-8', buffering=buffering)
+
+    counts = collections.Counter()
+    errors = []
+    try:
+        try:
+            parses = _read_until_error(
+                _read_parses(stream, args.format, args.field, args.column), errors)
+            results = iconvert_many(parses, args.workers, args.chunksize, results=True)
+            for index, result in enumerate(results):
+                counts[result.status] += 1
+                if result.status == OK:
+                    output.write(result.statement)
+                elif failures != None:
+                    failures.write('%d\t%s\t%s\n' % (index, result.status, result.reason))
+                output.write('\n')
+            output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+            if failures != None:
+                failures.close()
+            if source != None:
+                if stream is not source:
+                    stream.close()
+                source.close()
+    except BrokenPipeError:
+        if output is not sys.stdout:
+            raise
+        # the reader of stdout is gone, stdout goes to devnull so that
+        # flushing it again on exit does not fail
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    print('%d trees: %d converted, %d unsupported, %d malformed'
+          % (sum(counts.values()), counts[OK], counts[UNSUPPORTED], counts[MALFORMED]),
+          file=sys.stderr)
+    if errors:
+        print('%s: error: input read up to tree %d: %s'
+              % (parser.prog, sum(counts.values()), _reason(errors[0])), file=sys.stderr)
+        return 1
+    return 1 if counts[MALFORMED] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Benchmarks for POSTree.
+
+Usage: python benchmark.py [--rounds N] [--output FILE] [benchmark ...]
+
+The suite benchmark times every stage of the conversion on a synthetic
+corpus and can write its results as JSON, to be compared over time.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+from POSTree import CompactTree, POSTree, tokenize
+
+
+def long_parse(n):
+    """A question whose object NP has n nouns, e.g. 'is the boy holding a toy toy ...'."""
+    return ('(ROOT\n'
+            '  (SQ (VBZ Is)\n'
+            '    (NP (DT the) (NN boy))\n'
+            '    (VP (VBG holding)\n'
+            '      (NP (DT a)%s))\n'
+            '    (. ?)))' % (' (NN toy)' * n))
+
+
+def deep_parse(n):
+    """A question with n nested VPs, e.g. 'is the boy holding holding ... a toy'."""
+    return ('(ROOT (SQ (VBZ Is) (NP (DT the) (NN boy)) %s(NP (DT a) (NN toy))%s (. ?)))'
+            % ('(VP (VBG holding) ' * n, ')' * n))
+
+
+# One question for every structure adjust_order() handles. {np} is a noun
+# phrase whose shape does not change the rule applied, replaced to scale
+# the tree up.
+TEMPLATES = [
+    ('SQ', '(ROOT (SQ (VBZ Is) (NP (DT the) (NN boy)) (VP (VBG holding) {np}) (. ?)))'),
+    ('SQ do', '(ROOT (SQ (VBZ Does) (NP (DT the) (NN boy)) (VP (VB hold) {np}) (. ?)))'),
+    ('SBARQ SQ', '(ROOT (SBARQ (SQ (VBZ Is) (NP (DT the) (NN boy)) (VP (VBG holding) {np})) (. ?)))'),
+    ('WHNP subject', '(ROOT (SBARQ (WHNP (WP who)) (SQ (VP (VBZ is) (VP (VBG holding) {np}))) (. ?)))'),
+    ('WHNP object', '(ROOT (SBARQ (WHNP (WP what)) (SQ (VBZ is) (NP (NP (DT the) (NN boy)) (PP (IN on) {np})) (VP (VBG holding))) (. ?)))'),
+    ('WHNP be NP', '(ROOT (SBARQ (WHNP (WP what)) (SQ (VBZ is) {np}) (. ?)))'),
+    ('WHNP be PP', '(ROOT (SBARQ (WHNP (WP what)) (SQ (VBZ is) (PP (IN on) {np})) (. ?)))'),
+    ('WHNP color', '(ROOT (SBARQ (WHNP (WDT what) (NN color) (NN shirt)) (SQ (VBZ is) (NP (NP (DT the) (NN boy)) (PP (IN on) {np})) (VP (VBG wearing))) (. ?)))'),
+    ('WHNP how many', '(ROOT (SBARQ (WHNP (WHADJP (WRB how) (JJ many)) (NNS dogs)) (SQ (VBP are) (PP (IN on) {np})) (. ?)))'),
+    ('WHNP negation', "(ROOT (SBARQ (WHNP (WP what)) (SQ (VBZ does) (RB n't) (NP (NP (DT the) (NN boy)) (PP (IN on) {np})) (VP (VB like))) (. ?)))"),
+    ('WHNP to VB', '(ROOT (SBARQ (WHNP (WP what)) (SQ (VBP do) (NP (NP (PRP you)) (PP (IN at) {np})) (VP (VB want) (S (VP (TO to) (VP (VB eat)))))) (. ?)))'),
+    ('WHADVP where', '(ROOT (SBARQ (WHADVP (WRB where)) (SQ (VBZ is) (NP (NP (DT the) (NN dog)) (PP (IN on) {np}))) (. ?)))'),
+    ('WHADVP why', '(ROOT (SBARQ (WHADVP (WRB why)) (SQ (VBZ is) (NP (DT the) (NN boy)) (VP (VBG holding) {np})) (. ?)))'),
+    ('WHADVP how passive', '(ROOT (SBARQ (WHADVP (WRB how)) (SQ (VBZ is) (NP (NP (DT the) (NN toy)) (PP (IN on) {np})) (VP (VBN made))) (. ?)))'),
+    ('WHADJP', '(ROOT (SBARQ (WHADJP (WRB how) (JJ old)) (SQ (VBZ is) (NP (NP (DT the) (NN boy)) (PP (IN on) {np}))) (. ?)))'),
+    ('WHPP', '(ROOT (SBARQ (WHPP (IN in) (WHNP (WDT what) (NN room))) (SQ (VBZ is) (NP (NP (DT the) (NN boy)) (PP (IN with) {np}))) (. ?)))'),
+    ('WHPP NP VP', '(ROOT (SBARQ (WHPP (IN in) (WHNP (WDT what) (NN room))) (SQ (NP (DT the) (NN boy)) (VP (VBZ sits) (PP (IN near) {np}))) (. ?)))'),
+    ('SBAR how many', '(ROOT (SBAR (WHADJP (WRB how) (JJ many)) (S (NP (NNS dogs)) (VP (VBP are) (PP (IN on) {np}))) (. ?)))'),
+    ('FRAG how many', '(ROOT (FRAG (WHADJP (WRB how) (JJ many)) (NP (NP (NNS dogs)) (PP (IN on) {np})) (. ?)))'),
+]
+
+BASE_NP = '(NP (DT the) (NN table))'
+
+
+def deep_np(n):
+    """A noun phrase nested n times, 'the table of the table of ...'."""
+    return '(NP (NP (DT the) (NN table)) (PP (IN of) ' * n + BASE_NP + '))' * n
+
+
+def long_np(n):
+    """A noun phrase with n adjectives, 'the big big ... table'."""
+    return '(NP (DT the)' + ' (JJ big)' * n + ' (NN table))'
+
+
+def synthetic_corpus(scales=(10, 100)):
+    """Return (template, variant, parse) for every template and its deep
+    and long variants.
+    """
+    corpus = []
+    for name, template in TEMPLATES:
+        corpus.append((name, 'base', template.format(np=BASE_NP)))
+        for n in scales:
+            corpus.append((name, 'deep %d' % n, template.format(np=deep_np(n))))
+            corpus.append((name, 'long %d' % n, template.format(np=long_np(n))))
+    return corpus
+
+
+def measure(func, repeat=5):
+    """Best time of func() over repeat runs, in seconds."""
+    number, _ = timeit.Timer(func).autorange()
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def time_stages(text):
+    """Seconds spent tokenizing text, building its tree and restructuring it.
+
+    Building includes tokenizing, as POSTree does both.
+    """
+    start = time.perf_counter()
+    tokenize(text)
+    tokenized = time.perf_counter()
+    tree = POSTree(text)
+    built = time.perf_counter()
+    tree.adjust_order()
+    restructured = time.perf_counter()
+    return {'tokenize': tokenized - start,
+            'build': built - tokenized,
+            'restructure': restructured - built,
+            'total': restructured - tokenized}
+
+
+def percentile(sorted_samples, q):
+    return sorted_samples[int(q * (len(sorted_samples) - 1))]
+
+
+def summarize(samples):
+    """Throughput and latency of a list of per-tree seconds."""
+    samples = sorted(samples)
+    return {'trees_per_second': len(samples) / sum(samples),
+            'p50_us': percentile(samples, 0.5) * 1e6,
+            'p99_us': percentile(samples, 0.99) * 1e6}
+
+
+def bench_suite(args):
+    """Time every stage on the synthetic corpus, per template and variant."""
+    corpus = synthetic_corpus()
+    samples = {}
+    for _ in range(args.rounds):
+        for name, variant, text in corpus:
+            for stage, seconds in time_stages(text).items():
+                samples.setdefault((name, variant, stage), []).append(seconds)
+
+    results = []
+    by_variant = {}
+    for (name, variant, stage), seconds in sorted(samples.items()):
+        results.append(dict(template=name, variant=variant, stage=stage,
+                            **summarize(seconds)))
+        by_variant.setdefault((variant, stage), []).extend(seconds)
+    print('%-10s %-12s %12s %10s %10s' % ('variant', 'stage', 'trees/s', 'p50 us', 'p99 us'))
+    for (variant, stage), seconds in sorted(by_variant.items()):
+        summary = summarize(seconds)
+        print('%-10s %-12s %12.0f %10.1f %10.1f'
+              % (variant, stage, summary['trees_per_second'],
+                 summary['p50_us'], summary['p99_us']))
+
+    if args.output:
+        report = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  'python': platform.python_version(),
+                  'implementation': platform.python_implementation(),
+                  'rounds': args.rounds,
+                  'results': results}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+def bench_construction(args):
+    """Time POSTree construction on long parse strings."""
+    for n in (10, 100, 1000, 10000):
+        text = long_parse(n)
+        seconds = measure(lambda: POSTree(text))
+        print('construction %6d words: %10.1f us/tree %8.2f MB/s'
+              % (n, seconds * 1e6, len(text) / seconds / 1e6))
+
+
+def bench_shapes(args):
+    """Time construction and conversion of deep and wide synthetic trees."""
+    for shape, parse in (('deep', deep_parse), ('wide', long_parse)):
+        for n in (10, 100, 1000, 10000):
+            text = parse(n)
+            build = measure(lambda: POSTree(text))
+            convert = measure(lambda: POSTree(text).adjust_order())
+            print('%s %6d: build %10.1f us/tree, build + convert %10.1f us/tree'
+                  % (shape, n, build * 1e6, convert * 1e6))
+
+
+def allocated(func):
+    """Bytes still allocated by func() when it returns, and its result."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args, count=10000):
+    """Compare Node objects with CompactTree in memory and speed."""
+    texts = [(long_parse if i % 2 else deep_parse)(i % 30) for i in range(count)]
+    nodes = sum(len(POSTree(text).words) for text in texts)
+    print('%d trees, %d words' % (count, nodes))
+    for name, build in (('Node', lambda text: POSTree(text).root),
+                        ('CompactTree', CompactTree.from_text)):
+        size, trees = allocated(lambda: [build(text) for text in texts])
+        seconds = measure(lambda: [build(text) for text in texts], repeat=3)
+        print('%-12s %8.0f bytes/tree, build %7.1f us/tree'
+              % (name, size / count, seconds / count * 1e6))
+    tree = CompactTree.from_text(texts[-1])
+    for name, func in (('CompactTree.words()', tree.words),
+                       ('POSTree.from_compact()', lambda: POSTree.from_compact(tree))):
+        print('%-22s %7.1f us/tree' % (name, measure(func) * 1e6))
+
+
+BENCHMARKS = {
+    'construction': bench_construction,
+    'memory': bench_memory,
+    'shapes': bench_shapes,
+    'suite': bench_suite,
+}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmarks for POSTree.')
+    parser.add_argument('benchmarks', nargs='*',
+                        help='benchmarks to run among %s, all by default'
+                        % ', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('--rounds', type=int, default=20,
+                        help='passes over the synthetic corpus (suite)')
+    parser.add_argument('--output', help='write the results as JSON (suite)')
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark %r' % name)
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        BENCHMARKS[name](args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,191 @@
+"""Differential harness for alternative POSTree engines.
+
+Usage: python compare.py [--corpus FILE] [--rounds N] [--limit N] [engine ...]
+
+Runs the reference conversion, the adjust_order() of the frozen original
+in reference.py, and every engine on the same corpus. Each statement, and
+the type of each exception raised, has to match the reference, except for
+the intended changes listed in CHANGED. Every mismatch is printed,
+then the throughput and the peak memory of each engine relative to the
+reference.
+
+An engine is one of the built-in ones or 'module:function', a function
+taking a parse text and returning its statement or raising. The corpus is
+a file of stanford parser output, or the synthetic one of benchmark.py
+along with broken variants of its trees.
+"""
+import argparse
+import importlib
+import sys
+import time
+import tracemalloc
+
+import reference as original
+from POSTree import CompactTree, Converter, POSTree, iter_trees
+from benchmark import synthetic_corpus
+
+
+def reference(text):
+    return original.POSTree(text).adjust_order()
+
+
+# (reference exception, engine exception, engine message) of the intended
+# changes, where the original crashes with AttributeError:
+CHANGED = {
+    # RULES_VERSION 2 raises the error of the rule table for an SQ no
+    # rule handles
+    ('AttributeError', 'ValueError', 'First child of SQ in SBARQ is not VB*/MD'),
+    ('AttributeError', 'ValueError', 'Unknown SQ structure in SBARQ!'),
+    ('AttributeError', 'ValueError', 'Unknown SQ structure!'),
+    # a parse missing closing parentheses is rejected when it is read
+    ('AttributeError', 'ValueError', 'Unbalanced parse tree!'),
+}
+
+ENGINES = {
+    'current': lambda text: POSTree(text).adjust_order(),
+    'converter': Converter().convert,
+    'lazy': Converter(lazy=True).convert,
+    'copy': lambda text: POSTree(text).adjust_order(inplace=False),
+    'compact': lambda text: POSTree.from_compact(CompactTree.from_text(text)).adjust_order(),
+}
+
+
+def load_engine(name):
+    """Return the built-in engine name, or the function of 'module:function'."""
+    if name in ENGINES:
+        return ENGINES[name]
+    module, _, function = name.partition(':')
+    if not function:
+        raise ValueError('Unknown engine %r!' % name)
+    return getattr(importlib.import_module(module), function)
+
+
+def broken(text):
+    """Variants of text which adjust_order() rejects in different ways."""
+    return [text.replace(' (. ?)', ''),
+            text.replace('(SQ ', '(S ', 1),
+            text.replace('(SBARQ ', '(SINV ', 1),
+            text.replace('(VBZ ', '(NN ', 1),
+            text[:-1]]
+
+
+def default_corpus():
+    corpus = []
+    for name, variant, text in synthetic_corpus():
+        corpus.append(text)
+        corpus.extend(broken(text))
+    return corpus
+
+
+def outcome(engine, text):
+    """('ok', statement) or ('error', 'ExceptionType', 'message')."""
+    try:
+        return ('ok', engine(text))
+    except Exception as e:
+        return ('error', type(e).__name__, str(e))
+
+
+def agrees(expected, result):
+    """Whether result matches the expected outcome: the same statement, or
+    an exception of the same type, or one of the changes listed in CHANGED.
+    Messages are not compared otherwise, they are not part of the behavior.
+    """
+    if expected[:2] == result[:2]:
+        return True
+    return (expected[0] == result[0] == 'error'
+            and (expected[1], result[1], result[2]) in CHANGED)
+
+
+def mismatches(engine, corpus, expected):
+    """Return (index, expected outcome, outcome) of every tree of corpus
+    whose outcome does not agree with the expected one.
+    """
+    found = []
+    for i, text in enumerate(corpus):
+        result = outcome(engine, text)
+        if not agrees(expected[i], result):
+            found.append((i, expected[i], result))
+    return found
+
+
+def throughput(engine, corpus, rounds):
+    """Trees per second of engine over corpus, the best of rounds passes."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in corpus:
+            try:
+                engine(text)
+            except Exception:
+                pass
+        seconds = time.perf_counter() - start
+        if best == None or seconds < best:
+            best = seconds
+    return len(corpus) / best
+
+
+def peak_memory(engine, corpus):
+    """Peak bytes allocated while engine converts corpus, tree by tree."""
+    tracemalloc.start()
+    try:
+        for text in corpus:
+            try:
+                engine(text)
+            except Exception:
+                pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Compare POSTree engines with the reference conversion.')
+    parser.add_argument('engines', nargs='*',
+                        help='engines among %s or module:function, '
+                        'all the built-in ones by default' % ', '.join(sorted(ENGINES)))
+    parser.add_argument('--corpus', help='file of stanford parser output')
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='timed passes over the corpus (default: 5)')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='mismatches printed per engine, all by default')
+    args = parser.parse_args(argv)
+    engines = []
+    for name in args.engines or sorted(ENGINES):
+        try:
+            engines.append((name, load_engine(name)))
+        except (ValueError, ImportError, AttributeError) as e:
+            parser.error('cannot load engine %r: %s' % (name, e))
+
+    if args.corpus:
+        with open(args.corpus, 'rb') as f:
+            corpus = list(iter_trees(f))
+    else:
+        corpus = default_corpus()
+    expected = [outcome(reference, text) for text in corpus]
+    failing = sum(1 for result in expected if result[0] == 'error')
+    print('%d trees, %d raise with the reference' % (len(corpus), failing))
+
+    base_speed = throughput(reference, corpus, args.rounds)
+    base_memory = peak_memory(reference, corpus)
+    print('%-24s %10s %12s %8s %12s %8s'
+          % ('engine', 'mismatches', 'trees/s', 'speed', 'peak bytes', 'memory'))
+    print('%-24s %10s %12.0f %8.2f %12d %8.2f'
+          % ('reference', '-', base_speed, 1.0, base_memory, 1.0))
+    failed = False
+    for name, engine in engines:
+        found = mismatches(engine, corpus, expected)
+        speed = throughput(engine, corpus, args.rounds)
+        memory = peak_memory(engine, corpus)
+        print('%-24s %10d %12.0f %8.2f %12d %8.2f'
+              % (name, len(found), speed, speed / base_speed,
+                 memory, memory / base_memory))
+        for i, want, got in found[:args.limit]:
+            print('    tree %d: expected %r, got %r' % (i, want, got))
+            print('        %s' % ' '.join(corpus[i].split()))
+        failed = failed or bool(found)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
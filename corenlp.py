@@ -0,0 +1,349 @@
+"""Pipeline from a CoreNLP parser server into POSTree.
+
+Questions are sent to the server in batches over a pool of keep-alive
+connections. Several batches are in flight at once and the parses of a
+batch are converted as soon as it comes back, so the latency of the
+parser overlaps with the conversion. Statements are yielded in the order
+of the questions. A question the server finds no sentence in, such as a
+blank one, fails on its own without failing its batch.
+
+    import asyncio
+    from corenlp import CoreNLPClient, aconvert
+
+    async def main(questions):
+        async with CoreNLPClient('localhost', 9000) as client:
+            async for statement in aconvert(questions, client):
+                print(statement)
+
+StubServer answers like a CoreNLP server from canned parses, to run the
+pipeline without one.
+"""
+import asyncio
+import bisect
+import collections
+import itertools
+import json
+import urllib.parse
+
+from POSTree import MALFORMED, Converter, Result
+
+PROPERTIES = {
+    'annotators': 'tokenize,ssplit,pos,parse',
+    'outputFormat': 'json',
+    # one sentence per line, so that every question gets exactly one parse
+    'ssplit.eolonly': 'true',
+}
+
+
+NO_SENTENCE = 'No sentence in the question!'
+
+
+class CoreNLPError(Exception):
+    pass
+
+
+async def _read_message(reader):
+    """Read the start line, headers and body of an HTTP/1.1 message.
+
+    Returns (start line, headers with lowercase names, body), or None if
+    the connection was closed before a message started.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    start = line.decode('latin-1').rstrip('\r\n')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise CoreNLPError('Connection closed in the headers!')
+        line = line.decode('latin-1').rstrip('\r\n')
+        if line == '':
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            chunks.append(chunk[:-2])
+        body = b''.join(chunks)
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return start, headers, body
+
+
+class CoreNLPClient(object):
+    """Client of a CoreNLP server keeping a pool of keep-alive connections."""
+
+    def __init__(self, host='localhost', port=9000, connections=4, timeout=60,
+                 properties=PROPERTIES):
+        """connections: maximum number of connections open at once, which
+            bounds the number of requests in flight.
+        timeout: seconds to wait for a response.
+        properties: the annotation properties sent with every request.
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.path = '/?properties=' + urllib.parse.quote(json.dumps(properties))
+        self.__idle = []
+        self.__slots = asyncio.Semaphore(connections)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the idle connections."""
+        idle, self.__idle = self.__idle, []
+        for reader, writer in idle:
+            writer.close()
+        for reader, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def parse(self, questions):
+        """Return the parse tree of every question, in order, None for a
+        question the server finds no sentence in. Blank questions are not
+        sent.
+        """
+        lines = [' '.join(question.split()) for question in questions]
+        parses = [None] * len(lines)
+        sent = [i for i, line in enumerate(lines) if line]
+        if not sent:
+            return parses
+        body = '\n'.join(lines[i] for i in sent)
+        response = json.loads(await self.request(body.encode('utf-8')))
+        sentences = response['sentences']
+        if len(sentences) == len(sent):
+            for i, sentence in zip(sent, sentences):
+                parses[i] = sentence['parse']
+            return parses
+        # some line gave no sentence, the sentences are matched to the
+        # lines by the offset of their first token, in UTF-16 code units
+        # like the offsets of the server
+        starts = []
+        offset = 0
+        for i in sent:
+            starts.append(offset)
+            offset += len(lines[i].encode('utf-16-le')) // 2 + 1
+        for sentence in sentences:
+            tokens = sentence.get('tokens')
+            if not tokens:
+                raise CoreNLPError('Expected %d parses, got %d!'
+                                   % (len(sent), len(sentences)))
+            i = sent[bisect.bisect_right(starts, tokens[0]['characterOffsetBegin']) - 1]
+            if parses[i] != None:
+                raise CoreNLPError('More than one sentence in %r!' % lines[i])
+            parses[i] = sentence['parse']
+        return parses
+
+    async def request(self, body):
+        """POST body and return the body of the response."""
+        async with self.__slots:
+            # an idle connection may have been closed by the server, a new
+            # one is tried once before giving up
+            while True:
+                reused = bool(self.__idle)
+                if reused:
+                    reader, writer = self.__idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout)
+                try:
+                    response = await asyncio.wait_for(
+                        self.__exchange(reader, writer, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if response == None:
+                    writer.close()
+                    if reused:
+                        continue
+                    raise CoreNLPError('Connection closed without a response!')
+                break
+        start, headers, content = response
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            self.__idle.append((reader, writer))
+        if start.split(' ', 2)[1] != '200':
+            raise CoreNLPError('%s: %s' % (start, content.decode('utf-8', 'replace')))
+        return content
+
+    async def __exchange(self, reader, writer, body):
+        writer.write(('POST %s HTTP/1.1\r\n'
+                      'Host: %s:%d\r\n'
+                      'Connection: keep-alive\r\n'
+                      'Content-Type: text/plain; charset=utf-8\r\n'
+                      'Content-Length: %d\r\n'
+                      '\r\n' % (self.path, self.host, self.port, len(body))
+                      ).encode('latin-1') + body)
+        await writer.drain()
+        return await _read_message(reader)
+
+
+async def aconvert(questions, client, batch_size=16, concurrency=4, results=False,
+                   converter=None):
+    """Parse questions with client and yield their statements in input order.
+
+    questions: an iterable of question strings, consumed lazily.
+    batch_size: number of questions sent in one request.
+    concurrency: number of requests in flight.
+    results: yield a POSTree.Result for every question instead of raising
+        when one cannot be converted. A question without a sentence is
+        MALFORMED, else it raises ValueError. A failed request raises in
+        both cases.
+    converter: the POSTree.Converter to use, a default one if None.
+    """
+    converter = converter or Converter()
+    convert = converter.convert_result if results else converter.convert
+    questions = iter(questions)
+    pending = collections.deque()
+    try:
+        while True:
+            batch = list(itertools.islice(questions, batch_size))
+            if batch:
+                pending.append(asyncio.ensure_future(client.parse(batch)))
+            while pending and (not batch or len(pending) >= concurrency):
+                for parse in await pending.popleft():
+                    if parse != None:
+                        yield convert(parse)
+                    elif results:
+                        yield Result(MALFORMED, None, 'ValueError: ' + NO_SENTENCE)
+                    else:
+                        raise ValueError(NO_SENTENCE)
+            if not batch:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def convert_questions(questions, host='localhost', port=9000, connections=4,
+                      batch_size=16, results=False):
+    """Parse and convert questions with a CoreNLP server, return the statements.
+
+    See CoreNLPClient and aconvert() for the arguments.
+    """
+    async def run():
+        async with CoreNLPClient(host, port, connections) as client:
+            return [statement async for statement in
+                    aconvert(questions, client, batch_size, connections, results)]
+    return asyncio.run(run())
+
+
+class StubServer(object):
+    """Local stand-in for a CoreNLP server answering with canned parses.
+
+    Every line of a request body is a question, answered with the parse
+    found for it, like a server run with ssplit.eolonly: a blank line
+    gives no sentence. A question without a parse is answered with a 500
+    error.
+
+        async with StubServer({'is the boy holding a toy ?': '(ROOT ...)'}) as server:
+            async with CoreNLPClient(server.host, server.port) as client:
+                ...
+    """
+
+    def __init__(self, parses, delay=0.0, host='127.0.0.1', port=0):
+        """parses: a mapping or a function from a question to its parse,
+            None for a question without a sentence.
+        delay: seconds to wait before every response, to stand for the
+            latency of a real parser.
+        port: the port to listen on, 0 picks a free one.
+        """
+        self.parses = parses
+        self.delay = delay
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.connections = 0
+        self.__server = None
+        self.__writers = set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """Start listening, self.port is then the port listened on."""
+        self.__server = await asyncio.start_server(self.__serve, self.host, self.port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.__server.close()
+        await self.drop_connections()
+        await self.__server.wait_closed()
+
+    async def drop_connections(self):
+        """Close the open connections, like a server timing out idle ones."""
+        writers, self.__writers = self.__writers, set()
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def __parse(self, question):
+        if callable(self.parses):
+            return self.parses(question)
+        return self.parses[question]
+
+    async def __serve(self, reader, writer):
+        self.connections += 1
+        self.__writers.add(writer)
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message == None:
+                    break
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                try:
+                    sentences = []
+                    offset = 0
+                    for line in message[2].decode('utf-8').split('\n'):
+                        parse = self.__parse(line) if line.strip() else None
+                        if parse != None:
+                            sentences.append({
+                                'index': len(sentences),
+                                'parse': parse,
+                                'tokens': [{'characterOffsetBegin': offset}],
+                            })
+                        offset += len(line.encode('utf-16-le')) // 2 + 1
+                    status = '200 OK'
+                    body = json.dumps({'sentences': sentences})
+                except Exception as e:
+                    status = '500 Internal Server Error'
+                    body = '%s: %s' % (type(e).__name__, e)
+                body = body.encode('utf-8')
+                writer.write(('HTTP/1.1 %s\r\n'
+                              'Content-Type: application/json; charset=utf-8\r\n'
+                              'Content-Length: %d\r\n'
+                              '\r\n' % (status, len(body))).encode('latin-1') + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.__writers.discard(writer)
+            writer.close()
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from POSTree import CacheInfo, ConversionCache, DiskCache, POSTree, convert
+
+QUESTIONS = [
+    '(ROOT (SQ (VBZ Is) (NP (DT the) (NN boy)) (VP (VBG holding)) (. ?)))',
+    '(ROOT (SQ (VBZ Is) (NP (DT the) (NN girl)) (VP (VBG running)) (. ?)))',
+    '(ROOT (SQ (VBZ Is) (NP (DT the) (NN dog)) (VP (VBG barking)) (. ?)))',
+]
+# adjust_order() raises AttributeError
+FAILING = '(ROOT (SQ (VBZ Is) (NP (DT the) (NN boy)) (VP (VBG holding))))'
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'conversions.db')
+
+    def test_reopen(self):
+        with DiskCache(self.path) as cache:
+            statements = [convert(text, cache) for text in QUESTIONS]
+        with DiskCache(self.path) as cache:
+            self.assertEqual([convert(text, cache) for text in QUESTIONS], statements)
+            self.assertEqual(cache.info().hits, 3)
+            self.assertEqual(cache.info().misses, 0)
+
+    def test_dropped_without_close(self):
+        # fewer entries than a commit batch are kept all the same
+        cache = DiskCache(self.path)
+        convert(QUESTIONS[0], cache)
+        del cache
+        with DiskCache(self.path) as cache:
+            self.assertEqual(len(cache), 1)
+
+    def test_commit_after(self):
+        cache = DiskCache(self.path)
+        with mock.patch.object(DiskCache, 'COMMIT_AFTER', 0.0):
+            convert(QUESTIONS[0], cache)
+        # read by another connection while the cache is open
+        with DiskCache(self.path) as other:
+            self.assertEqual(len(other), 1)
+        cache.close()
+
+    def test_version(self):
+        with DiskCache(self.path, version=1) as cache:
+            convert(QUESTIONS[0], cache)
+        with DiskCache(self.path, version=1) as cache:
+            self.assertEqual(len(cache), 1)
+        with DiskCache(self.path, version=2) as cache:
+            self.assertEqual(len(cache), 0)
+            convert(QUESTIONS[0], cache)
+            self.assertEqual(cache.info().misses, 1)
+
+    def test_maxsize(self):
+        with DiskCache(self.path, maxsize=2) as cache:
+            for text in QUESTIONS:
+                convert(text, cache)
+            self.assertEqual(len(cache), 2)
+            # the oldest entry is evicted
+            convert(QUESTIONS[2], cache)
+            convert(QUESTIONS[0], cache)
+            self.assertEqual((cache.info().hits, cache.info().misses), (1, 4))
+
+    def test_error(self):
+        with self.assertRaises(AttributeError) as expected:
+            POSTree(FAILING).adjust_order()
+        with DiskCache(self.path) as cache:
+            for _ in range(2):
+                with self.assertRaises(AttributeError) as raised:
+                    convert(FAILING, cache)
+                self.assertEqual(str(raised.exception), str(expected.exception))
+        with DiskCache(self.path) as cache:
+            with self.assertRaises(AttributeError):
+                convert(FAILING, cache)
+            self.assertEqual(cache.info().hits, 1)
+
+
+class ConversionCacheTest(unittest.TestCase):
+
+    def test_hits(self):
+        cache = ConversionCache()
+        statements = [convert(text, cache) for text in QUESTIONS]
+        self.assertEqual(statements, [POSTree(text).adjust_order() for text in QUESTIONS])
+        self.assertEqual(cache.info(), CacheInfo(0, 3, 1024, 3))
+        # the key ignores newlines, like POSTree.text
+        self.assertEqual(convert(QUESTIONS[0].replace(' (NP', '\n (NP'), cache), statements[0])
+        self.assertEqual([convert(text, cache) for text in QUESTIONS], statements)
+        self.assertEqual(cache.info(), CacheInfo(4, 3, 1024, 3))
+        cache.clear()
+        self.assertEqual(cache.info(), CacheInfo(0, 0, 1024, 0))
+
+    def test_lru(self):
+        cache = ConversionCache(maxsize=2)
+        convert(QUESTIONS[0], cache)
+        convert(QUESTIONS[1], cache)
+        # a hit makes QUESTIONS[0] the most recently used
+        convert(QUESTIONS[0], cache)
+        convert(QUESTIONS[2], cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.info(), CacheInfo(1, 3, 2, 2))
+        convert(QUESTIONS[0], cache)
+        convert(QUESTIONS[2], cache)
+        self.assertEqual(cache.info().hits, 3)
+        # QUESTIONS[1] was evicted, converting it again evicts QUESTIONS[0]
+        convert(QUESTIONS[1], cache)
+        self.assertEqual(cache.info(), CacheInfo(3, 4, 2, 2))
+        convert(QUESTIONS[0], cache)
+        self.assertEqual(cache.info(), CacheInfo(3, 5, 2, 2))
+
+    def test_unbounded(self):
+        cache = ConversionCache(maxsize=None)
+        texts = [QUESTIONS[0].replace('boy', 'boy%d' % i) for i in range(2000)]
+        for text in texts:
+            convert(text, cache)
+        self.assertEqual(cache.info(), CacheInfo(0, 2000, None, 2000))
+        for text in texts:
+            convert(text, cache)
+        self.assertEqual(cache.info(), CacheInfo(2000, 2000, None, 2000))
+
+    def test_error(self):
+        with self.assertRaises(AttributeError) as expected:
+            POSTree(FAILING).adjust_order()
+        cache = ConversionCache()
+        for _ in range(2):
+            with self.assertRaises(AttributeError) as raised:
+                convert(FAILING, cache)
+            self.assertIs(type(raised.exception), AttributeError)
+            self.assertEqual(raised.exception.args, expected.exception.args)
+        self.assertEqual(cache.info(), CacheInfo(1, 1, 1024, 1))
+        # an error from parsing the text is cached as well
+        for _ in range(2):
+            with self.assertRaises(ValueError) as raised:
+                convert(QUESTIONS[0][:-1], cache)
+            self.assertEqual(str(raised.exception), 'Unbalanced parse tree!')
+        self.assertEqual(cache.info(), CacheInfo(2, 2, 1024, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import POSTree
+
+PARSE = '(ROOT (SQ (VBZ is) (NP (DT the) (NN boy)) (VP (VBG holding)) (. ?)))'
+
+
+class MainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def run_main(self, lines, *options, status=0):
+        path = os.path.join(self.directory.name, 'input')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        output = os.path.join(self.directory.name, 'output')
+        with mock.patch('sys.stderr'):
+            self.assertEqual(POSTree.main([path, output] + list(options)), status)
+        with open(output, encoding='utf-8') as f:
+            return f.read().split('\n')[:-1]
+
+    def test_blank_lines(self):
+        # every line is a tree, blank ones too, so lines stay aligned
+        lines = [json.dumps({'parse': PARSE}), '', '   ', json.dumps(PARSE)]
+        self.assertEqual(self.run_main(lines, '--format', 'jsonl', '--workers', '1', status=1),
+                         ['the boy is **blank** holding', '', '', 'the boy is **blank** holding'])
+        lines = ['1\t' + PARSE, '', '2\t' + PARSE]
+        self.assertEqual(self.run_main(lines, '--format', 'tsv', '--workers', '1', status=1),
+                         ['the boy is **blank** holding', '', 'the boy is **blank** holding'])
+
+    def test_truncated_tree(self):
+        # the statements before and after a broken tree are written, the
+        # broken tree goes to the failures whatever the number of workers
+        lines = [PARSE] * 200 + ['(ROOT (SQ (VBZ Is)'] + [PARSE] * 10
+        failures = os.path.join(self.directory.name, 'failures')
+        for workers in ('1', '2'):
+            with self.subTest(workers=workers):
+                statements = self.run_main(lines, '--workers', workers, '--chunksize', '16',
+                                           '--failures', failures, status=1)
+                self.assertEqual(statements, ['the boy is **blank** holding'] * 200 + ['']
+                                 + ['the boy is **blank** holding'] * 10)
+                with open(failures, encoding='utf-8') as f:
+                    self.assertEqual(f.read(),
+                                     '200\tmalformed\tValueError: Unbalanced parse tree!\n')
+
+    def test_read_error(self):
+        # what is read before an undecodable line is still converted
+        path = os.path.join(self.directory.name, 'input')
+        with open(path, 'wb') as f:
+            f.write((PARSE + '\n').encode('utf-8') * 100 + b'\xff\n' + PARSE.encode('utf-8'))
+        output = os.path.join(self.directory.name, 'output')
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            self.assertEqual(POSTree.main([path, output, '--format', 'tsv', '--workers', '2',
+                                           '--chunksize', '16']), 1)
+        self.assertIn('UnicodeDecodeError', stderr.getvalue())
+        with open(output, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'the boy is **blank** holding\n' * 100)
+
+    def test_one_cpu(self):
+        with mock.patch.object(POSTree.multiprocessing, 'Pool') as pool:
+            with mock.patch.object(POSTree.os, 'cpu_count', return_value=1):
+                self.assertEqual(self.run_main([PARSE]), ['the boy is **blank** holding'])
+        pool.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
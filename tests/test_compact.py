@@ -0,0 +1,87 @@
+import random
+import unittest
+
+from POSTree import PTB_LABELS, CompactTree, LabelTable, POSTree
+from tests.test_regression import golden_corpus
+
+DELETE_TREE = POSTree._POSTree__delete_tree
+DELETE_NODE = POSTree._POSTree__delete_node
+INSERTS = (('insert_after', POSTree._POSTree__insert_after),
+           ('insert_as_first_child', POSTree._POSTree__insert_as_first_child),
+           ('insert_as_last_child', POSTree._POSTree__insert_as_last_child))
+
+
+def preorder(root):
+    """The nodes under root in the order CompactTree.from_text() numbers them."""
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        children = []
+        child = node.first_child
+        while child != None:
+            children.append(child)
+            child = child.next_sibling
+        stack.extend(reversed(children))
+    return nodes
+
+
+def prenode(node):
+    return node.parent if node.prev_sibling == None else node.prev_sibling
+
+
+class EditTest(unittest.TestCase):
+    """The edit operations of CompactTree against those of POSTree."""
+
+    def check(self, text, seed):
+        rand = random.Random(seed)
+        tree = POSTree(text)
+        compact = CompactTree.from_text(text)
+        nodes = preorder(tree.root)
+        index = dict((node, i) for i, node in enumerate(nodes))
+        for _ in range(10):
+            attached = preorder(tree.root)[1:]
+            if not attached:
+                break
+            node = rand.choice(attached)
+            if rand.random() < 0.3:
+                compact.delete_node(index[prenode(node)], index[node])
+                DELETE_NODE(tree, node)
+            else:
+                compact.delete_tree(index[prenode(node)], index[node])
+                DELETE_TREE(tree, node)
+                dst = rand.choice(preorder(tree.root))
+                # the root has no siblings
+                name, insert = rand.choice(INSERTS[dst is tree.root:])
+                getattr(compact, name)(index[node], index[dst])
+                insert(tree, node, dst)
+            self.assertEqual(compact.to_text(), CompactTree.from_node(tree.root).to_text())
+            self.assertEqual(compact.words(), tree._POSTree__gather_word(tree.root))
+
+    def test_edits(self):
+        for seed, text in enumerate(golden_corpus()):
+            try:
+                POSTree(text)
+            except ValueError:
+                continue
+            with self.subTest(seed=seed):
+                self.check(text, seed)
+
+
+class LabelsTest(unittest.TestCase):
+
+    def test_own_table(self):
+        text = '(ROOT (SQ (VBZ is) (NP (DT the) (NN aardvarkian)) (. ?)))'
+        labels = LabelTable(PTB_LABELS)
+        before = len(CompactTree.labels.strings)
+        tree = CompactTree.from_text(text, labels)
+        self.assertEqual(len(CompactTree.labels.strings), before)
+        self.assertIn('aardvarkian', labels.ids)
+        self.assertEqual(tree.to_text(), CompactTree.from_text(text).to_text())
+        self.assertEqual(POSTree.from_compact(tree).adjust_order(), POSTree(text).adjust_order())
+        self.assertIs(POSTree(text).compact(labels).labels, labels)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from POSTree import MALFORMED, OK, Converter
+from corenlp import CoreNLPClient, CoreNLPError, StubServer, aconvert
+from tests.test_regression import read_golden
+
+QUESTION = 'what is the boy holding ?'
+PARSE = ('(ROOT (SBARQ (WHNP (WP what)) (SQ (VBZ is) (NP (DT the) (NN boy)) '
+         '(VP (VBG holding))) (. ?)))')
+
+
+def parses():
+    """Questions standing for the golden parses which convert."""
+    found = {}
+    for text, expected in read_golden():
+        if expected[0] == 'ok':
+            found['question %d ?' % len(found)] = text
+    return found
+
+
+class CoreNLPTest(unittest.IsolatedAsyncioTestCase):
+
+    async def convert(self, server, questions, **options):
+        connections = options.pop('connections', 2)
+        async with CoreNLPClient(server.host, server.port, connections) as client:
+            return [statement async for statement in
+                    aconvert(questions, client, concurrency=connections, **options)]
+
+    async def test_order(self):
+        canned = parses()
+        questions = sorted(canned, reverse=True)
+        async with StubServer(canned, delay=0.01) as server:
+            statements = await self.convert(server, questions, batch_size=3)
+        self.assertEqual(statements,
+                         [Converter().convert(canned[question]) for question in questions])
+
+    async def test_reuse(self):
+        async with StubServer({QUESTION: PARSE}) as server:
+            statements = await self.convert(server, [QUESTION] * 20, batch_size=2,
+                                            connections=2)
+            self.assertEqual(statements, ['the boy is holding **blank**'] * 20)
+            self.assertEqual(server.requests, 10)
+            self.assertLessEqual(server.connections, 2)
+
+    async def test_dropped_idle_connection(self):
+        async with StubServer({QUESTION: PARSE}) as server:
+            async with CoreNLPClient(server.host, server.port, connections=1) as client:
+                self.assertEqual(await client.parse([QUESTION]), [PARSE])
+                await server.drop_connections()
+                self.assertEqual(await client.parse([QUESTION]), [PARSE])
+            self.assertEqual(server.requests, 2)
+            self.assertEqual(server.connections, 2)
+
+    async def test_error_status(self):
+        async with StubServer({QUESTION: PARSE}) as server:
+            with self.assertRaisesRegex(CoreNLPError, '^HTTP/1.1 500 .*KeyError'):
+                await self.convert(server, [QUESTION, 'who is there ?'], results=True)
+            # a failed batch does not stop the server
+            self.assertEqual(await self.convert(server, [QUESTION]),
+                             ['the boy is holding **blank**'])
+
+    async def test_blank_question(self):
+        async with StubServer({QUESTION: PARSE}) as server:
+            results = await self.convert(server, [QUESTION, ' ', QUESTION, ''],
+                                         batch_size=4, results=True)
+            self.assertEqual([result.status for result in results],
+                             [OK, MALFORMED, OK, MALFORMED])
+            self.assertEqual(server.requests, 1)
+            with self.assertRaises(ValueError):
+                await self.convert(server, ['', QUESTION])
+
+    async def test_unparsed_question(self):
+        # the sentences are matched to the questions by their offsets
+        canned = {'😀 ?': PARSE, '...': None, QUESTION: PARSE}
+        async with StubServer(canned) as server:
+            async with CoreNLPClient(server.host, server.port) as client:
+                self.assertEqual(await client.parse(['😀 ?', '', '...', QUESTION]),
+                                 [PARSE, None, None, PARSE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Deeply nested trees are built and converted without recursion."""
+import sys
+import unittest
+
+import compare
+from benchmark import deep_parse
+from POSTree import Converter, POSTree
+from tests.test_input import nested
+
+DEPTH = 5000
+
+
+class DeepTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # deeper than the recursion limit, a recursive walk would fail
+        assert DEPTH > sys.getrecursionlimit()
+        cls.text = deep_parse(DEPTH)
+        cls.statement = 'the boy is **blank** %sa toy' % ('holding ' * DEPTH)
+
+    def test_reference(self):
+        self.assertEqual(compare.reference(deep_parse(10)),
+                         'the boy is **blank** %sa toy' % ('holding ' * 10))
+
+    def test_engines(self):
+        for name, engine in compare.ENGINES.items():
+            with self.subTest(engine=name):
+                self.assertEqual(engine(self.text), self.statement)
+
+    def test_tree(self):
+        tree = POSTree(self.text)
+        self.assertEqual(len(tree.words), DEPTH + 6)
+        self.assertEqual(POSTree.from_compact(tree.compact()).words, tree.words)
+        self.assertEqual(POSTree.from_tuple(nested(self.text)).words, tree.words)
+        self.assertEqual(tree.adjust_order(), self.statement)
+
+    def test_write_statement(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                pieces = []
+                Converter(lazy=lazy).write_statement(self.text, pieces.append)
+                self.assertEqual(''.join(pieces), self.statement)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Trees built from nested tuples, nltk trees and encoded text against
+trees parsed from the text, over the golden corpus.
+"""
+import unittest
+
+import compare
+from POSTree import POSTree, tokenize
+from tests.test_regression import read_golden
+
+try:
+    import nltk
+except ImportError:
+    nltk = None
+
+
+class Tree(list):
+    """The part of nltk.Tree that POSTree.from_nltk() uses."""
+
+    def __init__(self, label, children):
+        list.__init__(self, children)
+        self._label = label
+
+    def label(self):
+        return self._label
+
+
+def nested(text, make=lambda label, children: (label,) + tuple(children)):
+    """Read a parse into nested make(label, children), None if the
+    parentheses of text are unbalanced.
+    """
+    stack = [[]]
+    tokens = iter(tokenize(text))
+    for token in tokens:
+        if token == '(':
+            stack.append([next(tokens, None)])
+        elif token == ')':
+            if len(stack) < 2:
+                return None
+            node = stack.pop()
+            stack[-1].append(make(node[0], node[1:]))
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1 or len(stack[0]) != 1:
+        return None
+    return stack[0][0]
+
+
+class InputTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.records = read_golden()
+
+    def check(self, build, text, expected):
+        try:
+            parsed = POSTree(text)
+        except Exception as e:
+            self.assertRaises(type(e), build)
+            return
+        tree = build()
+        self.assertEqual(tree.words, parsed.words)
+        self.assertEqual(tree.question, parsed.question)
+        result = compare.outcome(lambda text: build().adjust_order(), text)
+        self.assertTrue(compare.agrees(expected, result), (expected, result))
+
+    def check_nested(self, make, from_nested):
+        checked = 0
+        for text, expected in self.records:
+            tree = nested(text, make)
+            if tree == None:
+                continue
+            checked += 1
+            with self.subTest(text=text):
+                self.check(lambda: from_nested(tree), text, expected)
+        self.assertGreater(checked, 0)
+
+    def test_tuple(self):
+        self.check_nested(lambda label, children: (label,) + tuple(children),
+                          POSTree.from_tuple)
+
+    def test_list(self):
+        self.check_nested(lambda label, children: [label] + list(children),
+                          POSTree.from_tuple)
+
+    def test_nltk(self):
+        self.check_nested(Tree, POSTree.from_nltk)
+
+    @unittest.skipIf(nltk == None, 'nltk is not installed')
+    def test_nltk_tree(self):
+        self.check_nested(nltk.Tree, POSTree.from_nltk)
+
+    def test_encoded(self):
+        for text, expected in self.records:
+            data = text.encode('utf-8')
+            for kind in (bytes, bytearray, memoryview):
+                with self.subTest(text=text, kind=kind.__name__):
+                    self.check(lambda: POSTree(kind(data)), text, expected)
+
+    def test_encoded_non_ascii(self):
+        text = '(ROOT (SQ (VBZ Is) (NP (DT the) (NN café)) (ADJP (JJ open)) (. ?)))'
+        for data in (text.encode('utf-8'), memoryview(text.encode('utf-8'))):
+            tree = POSTree(data)
+            self.assertEqual(tree.text, text)
+            self.assertEqual(tree.words, POSTree(text).words)
+            self.assertEqual(tree.adjust_order(), POSTree(text).adjust_order())
+
+    def test_bare_word(self):
+        for tree in (POSTree.from_tuple('Yes'), POSTree.from_nltk('Yes')):
+            self.assertEqual(tree.root.token, 'yes')
+            self.assertEqual(tree.root.first_child, None)
+            self.assertEqual(tree.words, ['yes'])
+            self.assertEqual(tree.question, 'yes')
+            self.assertEqual(tree.raw_text, None)
+            self.assertRaises(AttributeError, tree.adjust_order)
+
+
+if __name__ == '__main__':
+    unittest.main()
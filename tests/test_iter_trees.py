@@ -0,0 +1,58 @@
+import io
+import unittest
+
+from POSTree import Converter, MALFORMED, iter_trees
+from tests.test_regression import golden_corpus
+
+GOOD = '(ROOT (SQ (VBZ Is) (NP (DT the) (NN café)) (VP (VBG open)) (. ?)))'
+
+
+def split(data, chunk_size):
+    """The trees of data read as str and as UTF-8 bytes, chunk_size at a time."""
+    texts = list(iter_trees(io.StringIO(data), chunk_size=chunk_size))
+    binary = list(iter_trees(io.BytesIO(data.encode('utf-8')), chunk_size=chunk_size))
+    return texts, binary
+
+
+class IterTreesTest(unittest.TestCase):
+
+    def test_chunks(self):
+        trees = [text for text in golden_corpus() if text.count('(') == text.count(')')]
+        data = '\n'.join(trees) + '\n'
+        for chunk_size in (1, 2, 3, 5, 7, 64, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                texts, binary = split(data, chunk_size)
+                self.assertEqual(texts, trees)
+                self.assertEqual(binary, trees)
+
+    def test_multibyte(self):
+        # 'é' is 2 bytes and '€' 3, a chunk of 1 or 2 bytes splits them
+        tree = GOOD.replace('café', 'café€')
+        for chunk_size in (1, 2, 4):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(split(tree * 3, chunk_size), ([tree] * 3, [tree] * 3))
+
+    def test_pretty_printed(self):
+        tree = '(ROOT\n  (SQ (VBZ Is)\n    (NP (DT the) (NN café))\n    (. ?)))'
+        self.assertEqual(split(tree + '\n\n' + tree, 5), ([tree] * 2, [tree] * 2))
+
+    def test_junk(self):
+        data = 'Parsing [sent. 1 len. 5]: ' + GOOD + '\n) stray ) text\n' + GOOD + ' tail'
+        for chunk_size in (1, 3, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(split(data, chunk_size), ([GOOD] * 2, [GOOD] * 2))
+
+    def test_truncated(self):
+        broken = '(ROOT (SQ (VBZ Is)'
+        data = GOOD + '\n' + broken + '\n' + GOOD + ' ' + broken + ' ' + GOOD + '\n' + broken
+        expected = [GOOD, broken + '\n', GOOD, broken + ' ', GOOD, broken]
+        for chunk_size in (1, 2, 3, 5, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(split(data, chunk_size), (expected, expected))
+        converter = Converter()
+        self.assertEqual([converter.convert_result(text).status for text in expected[1::2]],
+                         [MALFORMED] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
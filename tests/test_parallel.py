@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+
+import POSTree
+from POSTree import OK, convert_many, convert_result, convert_shared
+from tests.test_regression import golden_corpus
+
+
+class SharedTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = golden_corpus() + ['', '(ROOT)']
+
+    def test_results(self):
+        self.assertEqual(convert_shared(self.corpus, workers=2, chunksize=16, results=True),
+                         [convert_result(text) for text in self.corpus])
+
+    def test_statements(self):
+        corpus = [text for text in self.corpus if convert_result(text).status == OK]
+        self.assertEqual(convert_shared(corpus, workers=2, chunksize=16),
+                         convert_many(corpus, workers=1))
+
+    def test_exceptions(self):
+        # the very exception of adjust_order() is raised again
+        for text in ['', '(ROOT)', self.corpus[1], self.corpus[2]]:
+            with self.subTest(text=text):
+                with self.assertRaises(Exception) as expected:
+                    convert_many([text], workers=1)
+                with self.assertRaises(Exception) as raised:
+                    convert_shared([self.corpus[0], text], workers=2, chunksize=1)
+                self.assertIs(type(raised.exception), type(expected.exception))
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_one_worker(self):
+        with mock.patch.object(POSTree.multiprocessing, 'Pool') as pool:
+            with mock.patch.object(POSTree.os, 'cpu_count', return_value=1):
+                self.assertEqual(convert_shared(self.corpus[:6], results=True),
+                                 [convert_result(text) for text in self.corpus[:6]])
+        pool.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
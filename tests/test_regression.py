@@ -0,0 +1,93 @@
+"""Golden outputs of the original conversion, checked against every engine.
+
+golden.jsonl holds one record per parse of the synthetic corpus of
+benchmark.py and of its broken variants: the statement the original
+adjust_order() returned, or the exception it raised. It is written by the
+frozen original in reference.py:
+
+    python -m tests.test_regression --regenerate
+"""
+import gc
+import json
+import os
+import sys
+import unittest
+
+import compare
+from benchmark import synthetic_corpus
+
+GOLDEN = os.path.join(os.path.dirname(__file__), 'golden.jsonl')
+
+
+def golden_corpus():
+    corpus = []
+    for name, variant, text in synthetic_corpus(scales=(10,)):
+        corpus.append(text)
+        corpus.extend(compare.broken(text))
+    return corpus
+
+
+def write_golden(path=GOLDEN):
+    with open(path, 'w', encoding='utf-8') as f:
+        for text in golden_corpus():
+            result = compare.outcome(compare.reference, text)
+            if result[0] == 'ok':
+                record = {'parse': text, 'statement': result[1]}
+            else:
+                record = {'parse': text, 'error': result[1], 'message': result[2]}
+            f.write(json.dumps(record) + '\n')
+
+
+def read_golden(path=GOLDEN):
+    """Return the (parse, outcome) of every record, see compare.outcome()."""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if 'error' in record:
+                result = ('error', record['error'], record['message'])
+            else:
+                result = ('ok', record['statement'])
+            records.append((record['parse'], result))
+    return records
+
+
+class GoldenTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.records = read_golden()
+
+    def test_corpus(self):
+        self.assertEqual([text for text, _ in self.records], golden_corpus())
+
+    def test_reference(self):
+        for text, expected in self.records:
+            self.assertEqual(compare.outcome(compare.reference, text), expected)
+
+    def test_engines(self):
+        for name, engine in sorted(compare.ENGINES.items()):
+            with self.subTest(engine=name):
+                for text, expected in self.records:
+                    result = compare.outcome(engine, text)
+                    self.assertTrue(compare.agrees(expected, result),
+                                    '%r: expected %r, got %r' % (text, expected, result))
+    def test_no_cycles(self):
+        # converted, failed and copied trees are freed by reference counting
+        for name, engine in sorted(compare.ENGINES.items()):
+            gc.collect()
+            gc.disable()
+            try:
+                for text, _ in self.records:
+                    compare.outcome(engine, text)
+                found = gc.collect()
+            finally:
+                gc.enable()
+            self.assertEqual(found, 0, name)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--regenerate']:
+        write_golden()
+    else:
+        unittest.main()
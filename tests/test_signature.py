@@ -0,0 +1,47 @@
+import unittest
+
+from POSTree import MALFORMED, OK, UNSUPPORTED, Converter, POSTree
+from tests.test_regression import golden_corpus
+
+
+def balanced_corpus():
+    corpus = []
+    for text in golden_corpus():
+        try:
+            POSTree(text)
+        except ValueError:
+            continue
+        corpus.append(text)
+    return corpus
+
+
+class SignatureTest(unittest.TestCase):
+
+    def test_lazy(self):
+        for text in balanced_corpus():
+            self.assertEqual(POSTree(text, lazy=True).signature(),
+                             POSTree(text).signature())
+
+    def test_SQ_labels(self):
+        # the period is dropped and an auxiliary under NN counts as VB
+        tree = POSTree('(ROOT (SQ (NN does) (NP (DT the) (NN dog)) (VP (VB bark)) (. ?)))')
+        self.assertEqual(tree.signature(), ('SQ', None, ('VB', 'NP', 'VP')))
+        tree = POSTree('(ROOT (SBARQ (WHNP (WP who)) (SQ (NN does) (NP (DT the) (NN dog))) (. ?)))')
+        self.assertEqual(tree.signature(), ('SBARQ', 'WHNP', ('VB', 'NP')))
+        self.assertEqual(tree.adjust_order(), 'the dog **blank**')
+
+    def test_classify(self):
+        self.assertEqual(POSTree.classify(POSTree('(ROOT)').signature()), MALFORMED)
+        for text in balanced_corpus():
+            status = POSTree.classify(POSTree(text).signature())
+            if status != None:
+                self.assertEqual(Converter().convert_result(text).status, status)
+        tree = POSTree('(ROOT (SBARQ (WHNP (WP what)) (SQ (NP (DT the) (NN dog))) (. ?)))')
+        self.assertEqual(POSTree.classify(tree.signature()), UNSUPPORTED)
+        tree = POSTree('(ROOT (SBARQ (WHNP (WP what)) (SQ (VBZ is) (NP (DT the) (NN dog))) (. ?)))')
+        self.assertEqual(POSTree.classify(tree.signature()), None)
+        self.assertEqual(Converter().convert_result(tree.raw_text).status, OK)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import io
+import unittest
+
+from POSTree import Converter, POSTree
+from tests.test_regression import read_golden
+
+FRAG = '(ROOT (FRAG (WHADJP (WRB how) (JJ many)) (NP (NNS dogs)) (. ?)))'
+PARSE = '(ROOT (SQ (VBZ Is) (NP (DT the) (NN boy)) (VP (VBG holding)) (. ?)))'
+
+
+def written(convert, *args):
+    """What convert(*args, write) writes, and the exception it raises."""
+    out = io.StringIO()
+    try:
+        convert(*args, out.write)
+    except Exception as e:
+        return out.getvalue(), type(e)
+    return out.getvalue(), None
+
+
+def expected(text):
+    try:
+        return POSTree(text).adjust_order(), None
+    except Exception as e:
+        return '', type(e)
+
+
+class WriteStatementTest(unittest.TestCase):
+
+    def test_golden(self):
+        for lazy in (False, True):
+            converter = Converter(lazy=lazy)
+            for text, _ in read_golden():
+                with self.subTest(lazy=lazy, text=text):
+                    # nothing is written when the conversion fails
+                    self.assertEqual(written(converter.write_statement, text), expected(text))
+
+    def test_tree(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                tree = POSTree(PARSE, lazy=lazy)
+                self.assertEqual(written(tree.write_statement), ('the boy is **blank** holding', None))
+
+    def test_frag(self):
+        # the statement of a "how many" fragment is written in one call
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                pieces = []
+                POSTree(FRAG, lazy=lazy).write_statement(pieces.append)
+                self.assertEqual(pieces, ['there are **blank** dogs'])
+
+    def test_words(self):
+        pieces = []
+        POSTree(PARSE).write_statement(pieces.append)
+        self.assertEqual(pieces, ['the', ' ', 'boy', ' ', 'is **blank**', ' ', 'holding'])
+
+    def test_copy(self):
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                tree = POSTree(PARSE, lazy=lazy)
+                for _ in range(2):
+                    out = io.StringIO()
+                    tree.write_statement(out.write, inplace=False)
+                    self.assertEqual(out.getvalue(), 'the boy is **blank** holding')
+                self.assertEqual(tree.adjust_order(), 'the boy is **blank** holding')
+
+
+if __name__ == '__main__':
+    unittest.main()